@@ -1,15 +1,18 @@
 import argparse
+import atexit
 import logging
 import os
 import sys
 import traceback
 from logging.handlers import RotatingFileHandler
 
-import requests
 from PyQt5.QtCore import QSettings
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QApplication, QErrorMessage
 
+from src.utils.ExceptionReporter import ExceptionReporter
+from src.utils.LogFileFormatter import LogFileFormatter
+from src.utils.LoggingPipeline import LoggingPipeline
 from src.widgets.GLADMainWindow import GLADMainWindow
 
 
@@ -41,6 +44,16 @@ if __name__ == "__main__":
     error_message.setMinimumSize(600, 600)
 
 
+    def api_logging_enabled() -> bool:
+        # Called from the reporter thread as well, which must not share the QSettings object of the main thread
+        return QSettings("Mirosław Wiącek Code", "GLAD").value("api_logging_enabled", defaultValue="false") == "true"
+
+
+    # Reports that cannot be sent are kept next to the logs, and sent when the API is reachable again
+    exception_reporter = ExceptionReporter(os.path.join("logs", "exception_spool.json"), api_logging_enabled)
+    exception_reporter.start()
+
+
     def handle_exception(exc_type, exc_value, exc_traceback):
         if issubclass(exc_type, KeyboardInterrupt):
             # Do not log interruptions caused by KeyboardInterrupt
@@ -54,24 +67,13 @@ if __name__ == "__main__":
 
         error_message.showMessage(html_exception)
 
-        if settings.value("api_logging_enabled", defaultValue="false") == "true":
-            # Send the exception to an API that registers errors
+        if api_logging_enabled():
+            # Send the exception to an API that registers errors, in the background
             API_ENDPOINT = settings.value(
                 "api_logging_endpoint",
                 defaultValue="http://localhost:8080/api/glad/exceptions"
             )
-
-            try:
-                response = requests.post(API_ENDPOINT, json={"exception": formatted_exception}, timeout=5)
-                # Raise a HTTPError if the HTTP request returned an unsuccessful status code
-                response.raise_for_status()
-
-                if response.status_code != 200:
-                    logging.error(f"Failed to send exception to API. Status code {response.status_code}")
-                else:
-                    logging.info(f"Uncaught exception logged and stored")
-            except Exception as e:
-                logging.error(f"Error occurred while sending exception to API: {e}")
+            exception_reporter.report(API_ENDPOINT, formatted_exception)
 
     sys.excepthook = handle_exception
 
@@ -92,14 +94,21 @@ if __name__ == "__main__":
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.DEBUG)  # Set the desired logging level for console
 
-    # Create a formatter and set it for all handlers
-    formatter = logging.Formatter("%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s - %(message)s")
+    # Create a formatter and set it for all handlers, it includes device IDs, so log files can be searched by device
+    formatter = LogFileFormatter()
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    # Add the handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Add the handlers to the logger through a queue, so file and console I/O is done by a separate thread
+    logging_pipeline = LoggingPipeline.install(file_handler, console_handler)
+
+
+    def shutdown():
+        # The reporter logs while spooling, so it is stopped while the logging pipeline still writes the records
+        exception_reporter.stop()
+        logging_pipeline.stop()
+
+    atexit.register(shutdown)
 
     mainWin = GLADMainWindow()
 
@@ -1,8 +1,15 @@
 import logging
-from typing import Set
+import os
+from typing import Set, List, Optional, Tuple
 
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QListView, QComboBox, QLineEdit, QLabel, QPushButton, QCheckBox
-from PyQt5.QtCore import pyqtSignal, QAbstractListModel, Qt, QObject, QModelIndex, QSortFilterProxyModel
+import numpy as np
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QListView, QComboBox, QLineEdit, QLabel, QPushButton, QCheckBox, \
+    QDateTimeEdit, QFormLayout
+from PyQt5.QtCore import pyqtSignal, QAbstractListModel, Qt, QObject, QModelIndex, QSortFilterProxyModel, QTimer, \
+    QDateTime, QThread
+
+from src.utils.LogIndexer import LogIndexer
+from src.utils.LoggingPipeline import LoggingPipeline
 
 
 class DeviceFilterDialog(QDialog):
@@ -78,68 +85,313 @@ class LogMessageProxyModel(QSortFilterProxyModel):
 
 
 class LogMessageModel(QAbstractListModel):
+    """
+    Model of the most recent log records, newest first.
+
+    Records are kept in a ring buffer of MAX_RECORDS entries, so once it is full, every new record overwrites
+    the oldest one in place, and rows are mapped to buffer indices with modular arithmetic. Incoming records are
+    collected and inserted in batches every INSERT_INTERVAL_MS, with a single row insertion per batch.
+
+    Formatted lines are cached in a second ring, next to their records, and tagged with the formatter version,
+    so repaints only format records not shown since the last formatter change.
+    """
     MAX_RECORDS = 20000  # Maximum number of log records
+    INSERT_INTERVAL_MS = 100
 
     def __init__(self):
         super().__init__()
-        self.records = []
-        self.visible_records = []
+        self.records: List[Optional[logging.LogRecord]] = [None] * self.MAX_RECORDS
+        self.head = 0  # index of the slot the next record is written to
+        self.count = 0
+        self.pending_records: List[logging.LogRecord] = []
         self.device_ids = set()
-        self.display_level = logging.DEBUG
+        # (formatter version, formatted line) of every record, None if not formatted yet
+        self.formatted_lines: List[Optional[Tuple[int, Optional[str]]]] = [None] * self.MAX_RECORDS
+
         self.formatter_str = "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+        self.formatter_version = 0
+        self.formatter = logging.Formatter(self.formatter_str)
+        self.device_formatter = logging.Formatter(self.device_formatter_str(self.formatter_str))
+
+        self.insert_timer = QTimer(self)
+        self.insert_timer.setSingleShot(True)
+        self.insert_timer.setInterval(self.INSERT_INTERVAL_MS)
+        self.insert_timer.timeout.connect(self.insert_pending_records)
 
     def rowCount(self, parent=None):
-        return len(self.visible_records)
+        return self.count
 
     def data(self, index, role=Qt.DisplayRole):
-        if not index.isValid() or index.row() >= len(self.records):
+        if not index.isValid() or index.row() >= self.count:
             return None
-        record = self.records[index.row()]
         if role == Qt.DisplayRole:
-            return self.format_record(record)
+            return self.formatted_line_at(index.row())
         elif role == Qt.UserRole:
-            return record
+            return self.record_at(index.row())
         return None
 
+    def record_at(self, row: int) -> logging.LogRecord:
+        # Row 0 is the newest record, the one just before the head
+        return self.records[self.slot_of(row)]
+
+    def slot_of(self, row: int) -> int:
+        return (self.head - 1 - row) % self.MAX_RECORDS
+
+    def formatted_line_at(self, row: int) -> Optional[str]:
+        slot = self.slot_of(row)
+        cached = self.formatted_lines[slot]
+        if cached is not None and cached[0] == self.formatter_version:
+            return cached[1]
+
+        line = self.format_record(self.records[slot])
+        self.formatted_lines[slot] = (self.formatter_version, line)
+        return line
+
     def insert_record(self, record: logging.LogRecord):
-        if len(self.records) >= self.MAX_RECORDS:
-            self.beginRemoveRows(QModelIndex(), len(self.records) - 1, len(self.records) - 1)
-            self.records.pop()  # Remove the oldest record
+        self.pending_records.append(record)
+        if not self.insert_timer.isActive():
+            self.insert_timer.start()
+
+    def insert_pending_records(self):
+        # Of a batch larger than the buffer, only the newest records would survive
+        records = self.pending_records[-self.MAX_RECORDS:]
+        self.pending_records = []
+        if not records:
+            return
+
+        # The oldest rows are at the end, their slots are reused by the new records
+        overflow = self.count + len(records) - self.MAX_RECORDS
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), self.count - overflow, self.count - 1)
+            self.count -= overflow
             self.endRemoveRows()
-        device_id = getattr(record, "device_id", None)
-        if device_id is not None:
-            self.device_ids.add(device_id)
-
-        self.beginInsertRows(QModelIndex(), 0, 0)
-        self.records.insert(0, record)  # Insert at the beginning
-        if record.levelno >= self.display_level:
-            self.visible_records.insert(0, record)  # Insert at the beginning
+
+        self.beginInsertRows(QModelIndex(), 0, len(records) - 1)
+        for record in records:
+            self.records[self.head] = record
+            self.formatted_lines[self.head] = None
+            self.head = (self.head + 1) % self.MAX_RECORDS
+
+            device_id = getattr(record, "device_id", None)
+            if device_id is not None:
+                self.device_ids.add(device_id)
+        self.count += len(records)
         self.endInsertRows()
 
-    def set_display_level(self, level):
-        self.display_level = level
-        self.visible_records = [record for record in self.records if record.levelno >= self.display_level]
-        self.modelReset.emit()
+    @staticmethod
+    def device_formatter_str(formatter_str: str) -> str:
+        # Records of devices show the device ID in place of the logger name
+        return formatter_str.replace("%(name)s", "%(device_id)s")
 
     def format_record(self, record):
         try:
             if hasattr(record, "device_id"):
-                return logging.Formatter(self.formatter_str.replace("%(name)s", "%(device_id)s")).format(record)
-            return logging.Formatter(self.formatter_str).format(record)
+                return self.device_formatter.format(record)
+            return self.formatter.format(record)
         except ValueError as ve:
             logging.error(f"Error formatting message: {ve}")
 
     def set_formatter(self, formatter_str):
+        try:
+            formatter = logging.Formatter(formatter_str)
+            device_formatter = logging.Formatter(self.device_formatter_str(formatter_str))
+        except ValueError as ve:
+            logging.error(f"Invalid log format {formatter_str}: {ve}")
+            return
+
         self.formatter_str = formatter_str
+        self.formatter = formatter
+        self.device_formatter = device_formatter
+        # Lines cached with previous versions are formatted again when shown
+        self.formatter_version += 1
         logging.debug(f"Formatter in model changed to {self.formatter_str}")
         self.dataChanged.emit(self.index(0), self.index(self.rowCount() - 1))
 
-    def refresh_visible_records(self):
-        self.visible_records = [
-            record for record in self.records
-            if record.levelno >= self.display_level
-        ]
-        self.modelReset.emit()
+
+class LogHistoryModel(QAbstractListModel):
+    """
+    Model of log records found in the log files. Only the index entries of the matching records are kept,
+    their text is read from the files in pages of PAGE_SIZE records, as the view scrolls down.
+    """
+    PAGE_SIZE = 500
+
+    def __init__(self):
+        super().__init__()
+        self.indexer: Optional[LogIndexer] = None
+        self.records = np.empty(0, dtype=LogIndexer.RECORD_DTYPE)
+        self.texts: List[str] = []
+
+    def set_records(self, indexer: LogIndexer, records: np.ndarray):
+        self.beginResetModel()
+        self.indexer = indexer
+        self.records = records
+        self.texts = []
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return len(self.texts)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return len(self.texts) < len(self.records)
+
+    def fetchMore(self, parent=QModelIndex()):
+        first = len(self.texts)
+        page = self.records[first:first + self.PAGE_SIZE]
+        try:
+            texts = self.indexer.read_records(page)
+        except OSError as e:
+            logging.error(f"Failed to read log records: {e}")
+            texts = [f"<failed to read: {e}>"] * len(page)
+
+        self.beginInsertRows(QModelIndex(), first, first + len(texts) - 1)
+        self.texts.extend(texts)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.texts):
+            return None
+        if role == Qt.DisplayRole:
+            return self.texts[index.row()]
+        return None
+
+
+class LogHistoryDialog(QDialog):
+    """
+    Search of the records in the log files, including rotated archives, by time range, level and device.
+    The files are indexed in the background before every search, which only parses files not indexed before.
+    """
+    LOG_FILE = os.path.join("logs", "app.log")
+    ALL_DEVICES = "All devices"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        logging.debug("Creating log history dialog")
+
+        # Disable "What's this" button
+        self.setWindowFlags(self.windowFlags() ^ Qt.WindowContextHelpButtonHint)
+
+        self.setWindowTitle("Log files")
+
+        self.indexer: Optional[LogIndexer] = None
+        self.index_thread: Optional[QThread] = None
+        # Run the search once indexing finishes, indexing on opening only fills the device list
+        self.search_requested = False
+
+        layout = QVBoxLayout()
+        form_layout = QFormLayout()
+
+        now = QDateTime.currentDateTime()
+        self.start_time = QDateTimeEdit(now.addDays(-1), self)
+        self.start_time.setCalendarPopup(True)
+        form_layout.addRow("From:", self.start_time)
+        self.end_time = QDateTimeEdit(now, self)
+        self.end_time.setCalendarPopup(True)
+        form_layout.addRow("To:", self.end_time)
+
+        self.level_dropdown = QComboBox(self)
+        for level in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
+            self.level_dropdown.addItem(level)
+        self.level_dropdown.setCurrentText("WARNING")
+        form_layout.addRow("Minimum level:", self.level_dropdown)
+
+        self.device_dropdown = QComboBox(self)
+        self.device_dropdown.addItem(self.ALL_DEVICES)
+        form_layout.addRow("Device:", self.device_dropdown)
+        layout.addLayout(form_layout)
+
+        self.search_button = QPushButton("Search", self)
+        self.search_button.clicked.connect(self.search)
+        layout.addWidget(self.search_button)
+
+        self.status_label = QLabel(self)
+        layout.addWidget(self.status_label)
+
+        self.model = LogHistoryModel()
+        self.view = QListView(self)
+        self.view.setModel(self.model)
+        layout.addWidget(self.view)
+
+        self.setLayout(layout)
+        self.setMinimumSize(700, 600)
+        self.setModal(False)
+
+        logging.debug("Dialog created")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Index in the background right away, so the device list is filled and the first search is fast
+        if self.index_thread is None and self.model.indexer is None:
+            self.start_indexing()
+
+    def closeEvent(self, event):
+        if self.indexer is not None:
+            self.indexer.cancel()
+        super().closeEvent(event)
+
+    def search(self):
+        self.search_requested = True
+        if self.index_thread is None:
+            self.start_indexing()
+
+    def start_indexing(self):
+        self.indexer = LogIndexer(self.LOG_FILE)
+        self.index_thread = QThread()
+        self.indexer.moveToThread(self.index_thread)
+
+        self.indexer.progress.connect(self._on_index_progress)
+        self.indexer.index_finished.connect(self._on_index_finished)
+        self.indexer.index_failed.connect(self._on_index_failed)
+        self.indexer.index_canceled.connect(self._on_index_canceled)
+
+        self.status_label.setText("Indexing log files...")
+        self.index_thread.started.connect(self.indexer.run)
+        self.index_thread.start()
+
+    def _on_index_progress(self, percent: int):
+        self.status_label.setText(f"Indexing log files... {percent}%")
+
+    def _on_index_finished(self, record_count: int):
+        indexer = self.indexer
+        self._stop_indexing()
+        self.status_label.setText(f"{record_count} records in {len(indexer.files)} log files")
+
+        # Keep the selection when the device list is refilled
+        selected_device = self.device_dropdown.currentText()
+        self.device_dropdown.clear()
+        self.device_dropdown.addItem(self.ALL_DEVICES)
+        self.device_dropdown.addItems(sorted(indexer.devices))
+        self.device_dropdown.setCurrentText(selected_device)
+
+        if self.search_requested:
+            self.search_requested = False
+            self.show_matching_records(indexer)
+
+    def _on_index_failed(self, error: str):
+        self._stop_indexing()
+        self.search_requested = False
+        self.status_label.setText(f"Indexing failed: {error}")
+
+    def _on_index_canceled(self):
+        self._stop_indexing()
+        self.search_requested = False
+        self.status_label.setText("")
+
+    def _stop_indexing(self):
+        self.index_thread.quit()
+        self.index_thread.wait()
+        self.index_thread = None
+        self.indexer = None
+
+    def show_matching_records(self, indexer: LogIndexer):
+        device_id = self.device_dropdown.currentText()
+        records = indexer.query(
+            self.start_time.dateTime().toSecsSinceEpoch(),
+            self.end_time.dateTime().toSecsSinceEpoch(),
+            getattr(logging, self.level_dropdown.currentText()),
+            set() if device_id == self.ALL_DEVICES else {device_id}
+        )
+        self.model.set_records(indexer, records)
+        self.status_label.setText(f"{len(records)} matching records")
 
 
 class LogViewingDialog(QDialog):
@@ -183,11 +435,22 @@ class LogViewingDialog(QDialog):
         self.device_filter_button.clicked.connect(self.show_device_filter_dialog)
         layout.addWidget(self.device_filter_button)
 
+        # Add button that opens the search of the log files, created when first needed
+        self.history_dialog = None
+        self.history_button = QPushButton("Search log files", self)
+        self.history_button.clicked.connect(self.show_history_dialog)
+        layout.addWidget(self.history_button)
+
         self.setLayout(layout)
 
         self.handler = QtLogHandler()
-        logging.getLogger().addHandler(self.handler)
         self.handler.log_signal.connect(self.model.insert_record)
+        # Receive the records from the logging thread if there is one, so logging threads do not emit the signal
+        pipeline = LoggingPipeline.instance()
+        if pipeline is not None:
+            pipeline.add_handler(self.handler)
+        else:
+            logging.getLogger().addHandler(self.handler)
 
         self.setMinimumSize(600, 600)
         self.setModal(False)
@@ -207,3 +470,9 @@ class LogViewingDialog(QDialog):
         if dialog.exec():
             self.proxy_model.selected_device_ids = dialog.selected_device_ids
             self.proxy_model.invalidateFilter()
+
+    def show_history_dialog(self):
+        if self.history_dialog is None:
+            self.history_dialog = LogHistoryDialog(self)
+        self.history_dialog.show()
+        self.history_dialog.raise_()
@@ -1,19 +1,21 @@
-import csv
 import logging
 import time
 from itertools import cycle
 
-import xlsxwriter as xlsxwriter
-from PyQt5.QtCore import Qt, QDateTime
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QTableWidget, QTableWidgetItem, QPushButton, QHBoxLayout, \
-    QDialogButtonBox, QFileDialog, QTreeWidget, QTreeWidgetItem, QAbstractItemView, QDateTimeEdit, QLabel, \
-    QRadioButton
+import numpy as np
+from PyQt5.QtCore import Qt, QDateTime, QAbstractTableModel, QModelIndex, QThread, QTimer
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QTableView, QPushButton, QHBoxLayout, \
+    QDialogButtonBox, QFileDialog, QTreeWidget, QTreeWidgetItem, QDateTimeEdit, QLabel, \
+    QRadioButton, QProgressDialog, QMessageBox, QDoubleSpinBox, QComboBox, QGroupBox, QFormLayout
 from pyqtgraph import PlotWidget, DateAxisItem, LinearRegionItem
 from datetime import datetime
 
-from typing import List
+from typing import List, Optional, Tuple, Dict
 
+from src.utils.MeasurementExporter import MeasurementExporter
+from src.utils.MeasurementSeries import MeasurementSeries
 from src.widgets.DeviceWidgetBase import DeviceWidgetBase
+from src.widgets.SeriesPlotDataItem import SeriesPlotDataItem
 
 
 class ExportDialog(QDialog):
@@ -32,9 +34,37 @@ class ExportDialog(QDialog):
         format_layout = QVBoxLayout()
         self.radio_excel = QRadioButton("Export as Excel")
         self.radio_csv = QRadioButton("Export as CSV")
+        self.radio_npz = QRadioButton("Export as NumPy bundle (.npz)")
+        self.radio_npy = QRadioButton("Export as NumPy arrays (.npy directory)")
+        self.radio_csv_wide = QRadioButton("Export as CSV, one column per measurement")
         self.radio_csv.setChecked(True)  # Default to CSV
         format_layout.addWidget(self.radio_excel)
         format_layout.addWidget(self.radio_csv)
+        format_layout.addWidget(self.radio_npz)
+        format_layout.addWidget(self.radio_npy)
+        format_layout.addWidget(self.radio_csv_wide)
+
+        # Common time grid of the wide format, only enabled if the format is selected
+        self.alignment_group = QGroupBox("Time alignment")
+        self.alignment_group.setEnabled(False)
+        self.radio_csv_wide.toggled.connect(self.alignment_group.setEnabled)
+
+        self.grid_step_spinbox = QDoubleSpinBox()
+        self.grid_step_spinbox.setRange(0, 86400)
+        self.grid_step_spinbox.setDecimals(3)
+        self.grid_step_spinbox.setSuffix(" s")
+        # With step 0 the rows are the timestamps of all samples of the selected measurements
+        self.grid_step_spinbox.setSpecialValueText("Sample timestamps")
+        self.grid_step_spinbox.setValue(1)
+
+        self.alignment_method_combobox = QComboBox()
+        self.alignment_method_combobox.addItems(["Previous sample", "Linear interpolation"])
+
+        alignment_layout = QFormLayout()
+        alignment_layout.addRow("Step", self.grid_step_spinbox)
+        alignment_layout.addRow("Values", self.alignment_method_combobox)
+        self.alignment_group.setLayout(alignment_layout)
+        format_layout.addWidget(self.alignment_group)
 
         # Time range selection
         time_layout = QVBoxLayout()
@@ -50,7 +80,7 @@ class ExportDialog(QDialog):
         self.device_selection_tree.setHeaderLabel("Data to export")
 
         for widget in widgets:
-            measurements = widget.get_measured_values()
+            measurements = widget.measurement_series
             # Skip devices with no measurements
             if not measurements:
                 continue
@@ -88,7 +118,16 @@ class ExportDialog(QDialog):
         logging.debug("Dialog created")
 
     def get_export_options(self):
-        file_format = "excel" if self.radio_excel.isChecked() else "csv"
+        if self.radio_excel.isChecked():
+            file_format = "excel"
+        elif self.radio_npz.isChecked():
+            file_format = "npz"
+        elif self.radio_npy.isChecked():
+            file_format = "npy"
+        elif self.radio_csv_wide.isChecked():
+            file_format = "csv_wide"
+        else:
+            file_format = "csv"
         start = self.start_time.dateTime().toSecsSinceEpoch()
         end = self.end_time.dateTime().toSecsSinceEpoch()
 
@@ -102,6 +141,12 @@ class ExportDialog(QDialog):
 
         return file_format, start, end, widgets
 
+    def get_alignment_options(self) -> Tuple[float, bool]:
+        """
+        :return: (grid_step, interpolate) options of the wide format, grid_step is 0 to align on sample timestamps
+        """
+        return self.grid_step_spinbox.value(), self.alignment_method_combobox.currentIndex() == 1
+
 
 class FilterDialog(QDialog):
     def __init__(self, unique_combinations, checked_combinations=None, parent=None):
@@ -165,7 +210,237 @@ class FilterDialog(QDialog):
         return [combo for combo, item in self.checkboxes.items() if item.checkState(0) == Qt.Checked]
 
 
+class MeasurementTableModel(QAbstractTableModel):
+    """
+    Read-only table of samples of multiple measures, backed directly by their timestamp and value arrays.
+
+    The samples passed to set_channels are kept in blocks, each a view of the samples of one measure, and rows are
+    numbered block after block. Samples appended later are copied into a single growing buffer of all channels,
+    numbered after the blocks, so appending neither renumbers existing rows nor keeps views of the series alive.
+    Cells are formatted only when the view asks for them, and sorting is done by index arrays computed with numpy,
+    so no per-row Python objects are ever created. Appended rows are merged into the current sort order by binary
+    search instead of sorting the whole table again.
+    """
+    HEADERS = ["Device", "Measurement", "Timestamp", "Value"]
+
+    def __init__(self):
+        super().__init__()
+        self.channels: List[Tuple[str, str]] = []
+
+        self.block_channels: List[int] = []
+        self.block_timestamps: List[np.ndarray] = []
+        self.block_values: List[np.ndarray] = []
+        # Index of the first row of every block, with the number of rows of all blocks at the end
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+        # Appended samples, the first appended_count entries are filled, numbered after the rows of the blocks
+        self.appended_channels = np.empty(0, dtype=np.int64)
+        self.appended_timestamps = np.empty(0, dtype=np.float64)
+        self.appended_values = np.empty(0, dtype=np.float64)
+        self.appended_count = 0
+
+        # Ascending sort index arrays, and the sorted keys, computed on first use and cached per column
+        self.sort_indices: Dict[int, np.ndarray] = {}
+        self.sorted_keys: Dict[int, np.ndarray] = {}
+        self.sort_column: Optional[int] = None
+        self.sort_order = Qt.AscendingOrder
+        # Row order currently displayed, None if rows are displayed in storage order
+        self.order: Optional[np.ndarray] = None
+
+    def set_channels(self, channels: List[Tuple[str, str, np.ndarray, np.ndarray]]):
+        """
+        Replace the contents of the model
+
+        :param channels: list of (device, measurement, timestamps, values) tuples
+        """
+        self.beginResetModel()
+        self.channels = [(device, measurement) for device, measurement, _, _ in channels]
+        self.block_channels = list(range(len(channels)))
+        self.block_timestamps = [timestamps for _, _, timestamps, _ in channels]
+        self.block_values = [values for _, _, _, values in channels]
+        self.offsets = np.concatenate([[0], np.cumsum([len(timestamps) for timestamps in self.block_timestamps])])
+        self.offsets = self.offsets.astype(np.int64)
+
+        self.appended_channels = np.empty(0, dtype=np.int64)
+        self.appended_timestamps = np.empty(0, dtype=np.float64)
+        self.appended_values = np.empty(0, dtype=np.float64)
+        self.appended_count = 0
+
+        self.sort_indices = {}
+        self.sorted_keys = {}
+        self.sort_column = None
+        self.order = None
+        self.endResetModel()
+
+    def append_samples(self, samples: List[Tuple[int, np.ndarray, np.ndarray]]):
+        """
+        Add samples of multiple channels at once, the arrays are copied
+
+        :param samples: list of (channel, timestamps, values) tuples, channel being the index of the channel
+            in the list passed to set_channels
+        """
+        samples = [(channel, timestamps, values) for channel, timestamps, values in samples if len(timestamps) > 0]
+        if not samples:
+            return
+
+        channels = np.concatenate([np.full(len(timestamps), channel) for channel, timestamps, _ in samples])
+        timestamps = np.concatenate([timestamps for _, timestamps, _ in samples])
+        values = np.concatenate([values for _, _, values in samples])
+        count = len(timestamps)
+
+        first_row = self.rowCount()
+        new_rows = np.arange(first_row, first_row + count)
+
+        if self.order is None:
+            self.beginInsertRows(QModelIndex(), first_row, first_row + count - 1)
+            self._append(channels, timestamps, values)
+            self.endInsertRows()
+            return
+
+        # Merge the new rows into the ascending order, after existing rows with equal keys, as a stable sort would
+        column = self.sort_column
+        new_keys = self._keys(column, channels, timestamps, values)
+        new_order = np.argsort(new_keys, kind="stable")
+        positions = np.searchsorted(self.sorted_keys[column], new_keys[new_order], side="right")
+        sort_indices = np.insert(self.sort_indices[column], positions, new_rows[new_order])
+        sorted_keys = np.insert(self.sorted_keys[column], positions, new_keys[new_order])
+        ascending = self.sort_order == Qt.AscendingOrder
+
+        # Commonly, e.g. for new samples sorted by timestamp, all new rows end up at one end of the table
+        existing_count = len(self.sort_indices[column])
+        if np.all(positions == existing_count) or np.all(positions == 0):
+            at_end = bool(positions[0] == existing_count) == ascending
+            if at_end:
+                self.beginInsertRows(QModelIndex(), first_row, first_row + count - 1)
+            else:
+                self.beginInsertRows(QModelIndex(), 0, count - 1)
+            self._append(channels, timestamps, values)
+            self._set_sort_indices(column, sort_indices, sorted_keys)
+            self.endInsertRows()
+            return
+
+        # Otherwise the rows are inserted at the end, and moved to their sorted positions
+        self.beginInsertRows(QModelIndex(), first_row, first_row + count - 1)
+        self._append(channels, timestamps, values)
+        self.order = np.concatenate([self.order, new_rows])
+        self.endInsertRows()
+
+        self.layoutAboutToBeChanged.emit()
+        self._set_sort_indices(column, sort_indices, sorted_keys)
+        self.layoutChanged.emit()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else int(self.offsets[-1]) + self.appended_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        device, measurement, timestamp, value = self.row_data(index.row())
+        column = index.column()
+        if column == 0:
+            return device
+        elif column == 1:
+            return measurement
+        elif column == 2:
+            return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        return str(value)
+
+    def row_data(self, row: int) -> Tuple[str, str, float, float]:
+        """
+        :return: (device, measurement, timestamp, value) of the displayed row
+        """
+        storage_row = int(self.order[row]) if self.order is not None else row
+
+        appended_row = storage_row - int(self.offsets[-1])
+        if appended_row >= 0:
+            device, measurement = self.channels[self.appended_channels[appended_row]]
+            return device, measurement, self.appended_timestamps[appended_row], self.appended_values[appended_row]
+
+        block = int(np.searchsorted(self.offsets, storage_row, side="right")) - 1
+        sample = storage_row - int(self.offsets[block])
+        device, measurement = self.channels[self.block_channels[block]]
+        return device, measurement, self.block_timestamps[block][sample], self.block_values[block][sample]
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        if column not in self.sort_indices:
+            keys = self._sort_keys(column)
+            indices = np.argsort(keys, kind="stable")
+            self.sort_indices[column] = indices
+            self.sorted_keys[column] = keys[indices]
+
+        self.layoutAboutToBeChanged.emit()
+        indices = self.sort_indices[column]
+        self.order = indices if order == Qt.AscendingOrder else indices[::-1]
+        self.layoutChanged.emit()
+
+    def _set_sort_indices(self, column: int, sort_indices: np.ndarray, sorted_keys: np.ndarray):
+        # Sort indices of other columns lack the new rows, they are computed again when needed
+        self.sort_indices = {column: sort_indices}
+        self.sorted_keys = {column: sorted_keys}
+        self.order = sort_indices if self.sort_order == Qt.AscendingOrder else sort_indices[::-1]
+
+    def _append(self, channels: np.ndarray, timestamps: np.ndarray, values: np.ndarray):
+        required = self.appended_count + len(timestamps)
+        if required > len(self.appended_timestamps):
+            # Grow by doubling, so appending is amortized O(1) per sample
+            capacity = max(required, 2 * len(self.appended_timestamps), 1024)
+            for name in ("appended_channels", "appended_timestamps", "appended_values"):
+                buffer = getattr(self, name)
+                grown = np.empty(capacity, dtype=buffer.dtype)
+                grown[:self.appended_count] = buffer[:self.appended_count]
+                setattr(self, name, grown)
+
+        self.appended_channels[self.appended_count:required] = channels
+        self.appended_timestamps[self.appended_count:required] = timestamps
+        self.appended_values[self.appended_count:required] = values
+        self.appended_count = required
+
+    def _keys(self, column: int, channels: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+        if column in (0, 1):
+            # Rank the channels by the text of the column, and give every row the rank of its channel
+            names = [channel[column] for channel in self.channels]
+            ranks = np.argsort(np.argsort(names, kind="stable"))
+            return ranks[channels]
+        if column == 2:
+            return timestamps
+        return values
+
+    def _sort_keys(self, column: int) -> np.ndarray:
+        block_channels = np.repeat(np.asarray(self.block_channels, dtype=np.int64), np.diff(self.offsets))
+        return self._keys(
+            column,
+            np.concatenate([block_channels, self.appended_channels[:self.appended_count]]),
+            np.concatenate(self.block_timestamps + [self.appended_timestamps[:self.appended_count]]),
+            np.concatenate(self.block_values + [self.appended_values[:self.appended_count]])
+        )
+
+
 class MeasurementDialog(QDialog):
+    # Number of points the overview curves are decimated to, independent of the number of samples
+    OVERVIEW_POINTS = 2000
+    # Interval of pulling samples appended since the dialog was populated, while the dialog is visible
+    REFRESH_INTERVAL_MS = 1000
+
+    # File dialog filter and extension of every export format
+    EXPORT_FORMATS = {
+        "excel": ("Excel Files (*.xlsx)", ".xlsx"),
+        "csv": ("CSV Files (*.csv)", ".csv"),
+        "npz": ("NumPy Bundle Files (*.npz)", ".npz"),
+        "npy": ("NumPy Array Directories (*)", ""),
+        "csv_wide": ("CSV Files (*.csv)", ".csv")
+    }
+
     def __init__(self, widgets: List[DeviceWidgetBase], parent=None):
         super().__init__(parent)
 
@@ -183,6 +458,7 @@ class MeasurementDialog(QDialog):
         self.time_control_plot = PlotWidget(axisItems={"bottom": DateAxisItem()})
         self.time_control_plot.setFixedHeight(100)
         self.time_control_plot.setMouseEnabled(x=False, y=False)
+        self.overview_curves: List[SeriesPlotDataItem] = []
 
         # Linear region for selecting time range
         self.time_region = LinearRegionItem()
@@ -202,17 +478,16 @@ class MeasurementDialog(QDialog):
         self.plot_widget = PlotWidget(axisItems={"bottom": DateAxisItem()}, parent=self)
         self.plot_widget.getPlotItem().showGrid(x=True, y=True, alpha=0.5)
         layout.addWidget(self.plot_widget)
+        self.curves: List[SeriesPlotDataItem] = []
 
-        # Create a table widget
-        self.table_widget = QTableWidget()
-        # Disable editing
-        self.table_widget.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.table_widget.setColumnCount(4)
-        self.table_widget.setHorizontalHeaderLabels(["Device", "Measurement", "Timestamp", "Value"])
-        layout.addWidget(self.table_widget)
+        # Create a table view, the model is read-only, so editing is disabled
+        self.table_model = MeasurementTableModel()
+        self.table_view = QTableView()
+        self.table_view.setModel(self.table_model)
+        layout.addWidget(self.table_view)
 
         # Make table sortable
-        self.table_widget.setSortingEnabled(True)
+        self.table_view.setSortingEnabled(True)
 
         # Create a button layout
         button_layout = QHBoxLayout()
@@ -231,13 +506,24 @@ class MeasurementDialog(QDialog):
         # Save the widget references
         self.widgets: List[DeviceWidgetBase] = widgets
 
+        # Export running in the background, if any
+        self.export_thread: Optional[QThread] = None
+        self.exporter: Optional[MeasurementExporter] = None
+        self.export_progress_dialog: Optional[QProgressDialog] = None
+
         # Initially display no measurements, force the user to use the filter dialog
         self.checked_combinations = set()
 
+        # (series, generation, length) of every channel of the table, as of the last population or refresh
+        self.snapshots: List[Tuple[MeasurementSeries, int, int]] = []
+        # The table is sorted by timestamp, newest first, until the user picks another order
+        self.table_populated = False
+
         self.populate_data()
 
-        # Sort by third column (timestamp) in descending order
-        self.table_widget.sortItems(2, Qt.DescendingOrder)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(self.REFRESH_INTERVAL_MS)
+        self.refresh_timer.timeout.connect(self.refresh_data)
 
         self.resize(550, 800)
 
@@ -248,10 +534,9 @@ class MeasurementDialog(QDialog):
 
         # Clear existing data first
         self.plot_widget.clear()
-        self.table_widget.setRowCount(0)
-
-        # Disable sorting while populating
-        self.table_widget.setSortingEnabled(False)
+        self.curves = []
+        self.snapshots = []
+        table_channels = []
 
         # Create a legend
         self.plot_widget.addLegend()
@@ -266,30 +551,38 @@ class MeasurementDialog(QDialog):
             "DarkSalmon", "CadetBlue", "SandyBrown", "Peru", "DarkOliveGreen"
         ])
 
-        row = 0
+        # Remove the overview curves of the previous population, keeping the time region
+        for curve in self.overview_curves:
+            self.time_control_plot.removeItem(curve)
+        self.overview_curves = []
+
         # Plot the same data on the control plot, but just as background
         for widget in self.widgets:
             class_name = str(widget)
-            data = widget.get_measured_values()
+            data = widget.query()
 
             if len(data) == 0:
                 continue
 
-            for key, values in data.items():
-                self.time_control_plot.plot(
-                    [p[0] for p in values],
-                    [p[1] for p in values],
+            for key in data:
+                # The overview always shows all samples, so it is drawn from a fixed-size envelope of the series
+                curve = SeriesPlotDataItem(
+                    widget.measurement_series[key],
+                    max_points=self.OVERVIEW_POINTS,
                     pen=0.2  # Lighter color to keep it as background
                 )
+                self.time_control_plot.addItem(curve)
+                curve.refresh()
+                self.overview_curves.append(curve)
 
-            for key, values in data.items():
+            for key, (x_values, y_values) in data.items():
                 if self.checked_combinations is not None and (class_name, key) not in self.checked_combinations:
                     continue
 
                 color = next(colors)  # Get the next color from the cycle
-                self.plot_widget.plot(
-                    [x[0] for x in values],
-                    [x[1] for x in values],
+                # The curve draws from the min/max pyramid of the series, decimated to the visible range
+                curve = SeriesPlotDataItem(
+                    widget.measurement_series[key],
                     pen={"color": color, "width": 2},
                     symbol="o",
                     symbolSize=5,
@@ -297,26 +590,32 @@ class MeasurementDialog(QDialog):
                     symbolBrush=color,
                     name=f"{class_name} - {key}"
                 )
-
-                # Populate table
-                for x, y in values:
-                    self.table_widget.insertRow(row)
-                    self.table_widget.setItem(row, 0, QTableWidgetItem(class_name))
-                    self.table_widget.setItem(row, 1, QTableWidgetItem(key))
-                    self.table_widget.setItem(row, 2,
-                                              QTableWidgetItem(datetime.fromtimestamp(x).strftime("%Y-%m-%d %H:%M:%S")))
-                    self.table_widget.setItem(row, 3, QTableWidgetItem(str(y)))
-                    row += 1
-
-        self.table_widget.setSortingEnabled(True)
-        self.table_widget.sortItems(2, Qt.DescendingOrder)
+                self.plot_widget.addItem(curve)
+                curve.refresh()
+                self.curves.append(curve)
+
+                series = widget.measurement_series[key]
+                table_channels.append((class_name, key, x_values, y_values))
+                self.snapshots.append((series, series.generation, len(x_values)))
+
+        # Populate table, sorted by third column (timestamp) in descending order the first time, later keeping
+        # the order and the scroll position chosen by the user, e.g. when compaction replaced samples
+        header = self.table_view.horizontalHeader()
+        if self.table_populated:
+            sort_column, sort_order = header.sortIndicatorSection(), header.sortIndicatorOrder()
+        else:
+            sort_column, sort_order = 2, Qt.DescendingOrder
+        scroll_position = self.table_view.verticalScrollBar().value()
+
+        self.table_model.set_channels(table_channels)
+        self.table_view.sortByColumn(sort_column, sort_order)
+        self.table_view.verticalScrollBar().setValue(scroll_position)
+        self.table_populated = True
 
         # After populating data, adjust the time_region to fit within the data time range
-        timestamps = [x[0] for widget in self.widgets for _, values in widget.get_measured_values().items() for x in
-                      values]
-        if timestamps:  # Check if we have any timestamps
-            min_time = min(timestamps)
-            max_time = max(timestamps)
+        time_range = self.get_data_time_range()
+        if time_range:  # Check if we have any timestamps
+            min_time, max_time = time_range
             # Get current region
             start, end = self.time_region.getRegion()
             # Adjust region to fit within data time range
@@ -326,10 +625,55 @@ class MeasurementDialog(QDialog):
 
         logging.debug("Finished populating data")
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Catch up with samples appended while the dialog was hidden
+        self.refresh_data()
+        self.refresh_timer.start()
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh_data(self):
+        """
+        Add samples appended since the last population or refresh to the table and plots
+        """
+        for series, generation, _ in self.snapshots:
+            if series.generation != generation:
+                # Samples already displayed were removed or replaced, so everything is populated again
+                self.populate_data()
+                return
+
+        # Samples of all channels are added at once, so they are merged into the sort order together
+        new_samples = []
+        for channel, (series, generation, length) in enumerate(self.snapshots):
+            timestamps = series.timestamps
+            if len(timestamps) > length:
+                new_samples.append((channel, timestamps[length:], series.values[length:len(timestamps)]))
+                self.snapshots[channel] = (series, generation, len(timestamps))
+        self.table_model.append_samples(new_samples)
+
+        for curve in self.curves + self.overview_curves:
+            curve.refresh_if_changed()
+
+    def get_data_time_range(self) -> Optional[Tuple[float, float]]:
+        """
+        :return: the timestamps of the oldest and newest samples of all widgets, or None if there are no samples
+        """
+        # Timestamps are sorted, so the first and last samples define the range of each measure
+        timestamps = [
+            series.timestamps for widget in self.widgets for series in widget.measurement_series.values()
+            if len(series) > 0
+        ]
+        if not timestamps:
+            return None
+        return min(x[0] for x in timestamps), max(x[-1] for x in timestamps)
+
     def filter_data(self):
         unique_combinations = set()
         for widget in self.widgets:
-            for key in widget.get_measured_values():
+            for key in widget.measurement_series:
                 unique_combinations.add((str(widget), key))
 
         dialog = FilterDialog(unique_combinations, self.checked_combinations)
@@ -346,11 +690,9 @@ class MeasurementDialog(QDialog):
 
     def export_data(self):
         # Calculate the min and max time from the data
-        timestamps = [
-            x[0] for widget in self.widgets for _, values in widget.get_measured_values().items() for x in values
-        ]
-        min_time = int(min(timestamps)) if timestamps else time.time() - 1800  # default to 30 minutes ago
-        max_time = int(max(timestamps)) if timestamps else time.time() + 1800  # default to 30 minutes in future
+        time_range = self.get_data_time_range()
+        min_time = int(time_range[0]) if time_range else time.time() - 1800  # default to 30 minutes ago
+        max_time = int(time_range[1]) if time_range else time.time() + 1800  # default to 30 minutes in future
 
         dialog = ExportDialog(self.widgets, min_time, max_time, self.checked_combinations, self)
         result = dialog.exec()
@@ -358,12 +700,12 @@ class MeasurementDialog(QDialog):
             file_format, start, end, selected_widgets = dialog.get_export_options()
 
             options = QFileDialog.Options()
-            ext = ".xlsx" if file_format == "excel" else ".csv"
+            file_filter, ext = self.EXPORT_FORMATS[file_format]
             path, _ = QFileDialog.getSaveFileName(
                 self,
                 "Save File",
                 "",
-                f"{file_format.capitalize()} Files (*{ext});;All Files (*)",
+                f"{file_filter};;All Files (*)",
                 options=options
             )
 
@@ -372,56 +714,66 @@ class MeasurementDialog(QDialog):
                     path += ext
 
                 logging.debug(f"Exporting to {file_format} at {path}, {start}-{end} from {selected_widgets}")
-                if file_format == "excel":
-                    rows_written = self.export_to_excel(path, start, end, selected_widgets)
-                else:
-                    rows_written = self.export_to_csv(path, start, end, selected_widgets)
-                logging.debug(f"Export done, written {rows_written} rows")
-
-    def export_to_csv(self, path: str, start_timestamp: int, end_timestamp: int, selected_widgets: List[str]) -> int:
-        rows = self.table_widget.rowCount()
-        cols = self.table_widget.columnCount()
-
-        with open(path, "w", newline="") as file:
-            writer = csv.writer(file)
-
-            # Write headers
-            logging.debug("Writing CSV headers")
-            headers = [self.table_widget.horizontalHeaderItem(col).text() for col in range(cols)]
-            writer.writerow(headers)
-
-            # Write content
-            logging.debug("Writing CSV content")
-            written = 0
-            for row in range(rows):
-                timestamp = datetime.strptime(self.table_widget.item(row, 2).text(), "%Y-%m-%d %H:%M:%S").timestamp()
-                if self.table_widget.item(row, 0).text() in selected_widgets and \
-                        start_timestamp <= timestamp <= end_timestamp:
-                    writer.writerow([self.table_widget.item(row, col).text() for col in range(cols)])
-                    written += 1
-
-            return written
-
-    def export_to_excel(self, path: str, start_timestamp: int, end_timestamp: int, selected_widgets: List[str]) -> int:
-        workbook = xlsxwriter.Workbook(path)
-        worksheet = workbook.add_worksheet()
-        rows = self.table_widget.rowCount()
-        cols = self.table_widget.columnCount()
-
-        # Write headers
-        for col in range(cols):
-            worksheet.write(0, col, self.table_widget.horizontalHeaderItem(col).text())
-
-        # Write content
-        row_num = 1
-        for row in range(rows):
-            timestamp = datetime.strptime(self.table_widget.item(row, 2).text(), "%Y-%m-%d %H:%M:%S").timestamp()
-            if self.table_widget.item(row, 0).text() in selected_widgets and \
-                    start_timestamp <= timestamp <= end_timestamp:
-                for col in range(cols):
-                    worksheet.write(row_num, col, self.table_widget.item(row, col).text())
-                row_num += 1
-
-        workbook.close()
-
-        return row_num - 1
+                grid_step, interpolate = dialog.get_alignment_options()
+                self.start_export(MeasurementExporter(
+                    path, self.get_series(selected_widgets), start, end, file_format, grid_step, interpolate
+                ))
+
+    def get_series(self, selected_widgets: List[Tuple[str, str]]) -> List[Tuple[str, str, MeasurementSeries]]:
+        """
+        :param selected_widgets: list of (device, measurement) pairs
+        :return: list of (device, measurement, series) tuples of the pairs, in the order of the widgets
+        """
+        return [
+            (str(widget), measurement, series)
+            for widget in self.widgets
+            for measurement, series in widget.measurement_series.items()
+            if (str(widget), measurement) in selected_widgets
+        ]
+
+    def start_export(self, exporter: MeasurementExporter):
+        """
+        Run the exporter in a background thread, showing its progress in a cancelable progress dialog
+        """
+        if self.export_thread is not None:
+            QMessageBox.warning(self, "Export in progress", "Wait for the current export to finish")
+            return
+
+        self.exporter = exporter
+        self.export_thread = QThread()
+        self.exporter.moveToThread(self.export_thread)
+
+        self.export_progress_dialog = QProgressDialog("Exporting measurements...", "Cancel", 0, 100, self)
+        self.export_progress_dialog.setWindowModality(Qt.WindowModal)
+        self.export_progress_dialog.setMinimumDuration(500)
+        self.export_progress_dialog.setAutoClose(False)
+        self.export_progress_dialog.setAutoReset(False)
+        self.export_progress_dialog.canceled.connect(self.exporter.cancel, Qt.DirectConnection)
+
+        self.exporter.progress.connect(self.export_progress_dialog.setValue)
+        self.exporter.export_finished.connect(self._on_export_finished)
+        self.exporter.export_failed.connect(self._on_export_failed)
+        self.exporter.export_canceled.connect(self._on_export_canceled)
+
+        self.export_thread.started.connect(self.exporter.run)
+        self.export_thread.start()
+
+    def _on_export_finished(self, rows_written: int):
+        self._stop_export()
+
+    def _on_export_failed(self, error: str):
+        self._stop_export()
+        QMessageBox.critical(self, "Export failed", f"Export failed: {error}")
+
+    def _on_export_canceled(self):
+        self._stop_export()
+
+    def _stop_export(self):
+        self.export_progress_dialog.close()
+        self.export_progress_dialog.deleteLater()
+        self.export_progress_dialog = None
+
+        self.export_thread.quit()
+        self.export_thread.wait()
+        self.export_thread = None
+        self.exporter = None
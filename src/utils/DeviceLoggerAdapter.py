@@ -1,14 +1,28 @@
 import logging
+from typing import Optional
 
 
 class DeviceLoggerAdapter(logging.LoggerAdapter):
     """
     A logging adapter used in device classes that adds the device ID to the message
+
+    The device ID is computed on first use and cached, as e.g. serial devices read it from settings. Call
+    refresh_device_id when the settings it is based on change. Records below the logger level are dropped by
+    LoggerAdapter.log, which checks isEnabledFor before process is called, so disabled levels cost no enrichment.
     """
+    def __init__(self, logger: logging.Logger, extra):
+        super().__init__(logger, extra)
+        self._device_id: Optional[str] = None
+
+    def refresh_device_id(self):
+        self._device_id = self.extra.device_id()
+
     def process(self, msg, kwargs):
+        if self._device_id is None:
+            self.refresh_device_id()
+
         extra = kwargs.get("extra", {})
-        extra["device_id"] = self.extra.device_id()
+        extra["device_id"] = self._device_id
         kwargs["extra"] = extra
 
         return msg, kwargs
-
@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Tuple, Optional, Callable
+
+import requests
+
+
+class ExceptionReporter:
+    """
+    Sends reports of uncaught exceptions to an API endpoint from a background thread, so the thread that caught
+    the exception never waits on the network.
+
+    Reports are collected for BATCH_DELAY seconds before sending, and identical tracebacks to the same endpoint
+    are merged into a single report with the number of occurrences. Reports that cannot be delivered, because
+    the endpoint is unreachable or fails, are spooled to a file, and replayed every REPLAY_INTERVAL seconds,
+    and on the next application run, as long as reporting is enabled.
+
+    Reports pending on stop are spooled without sending, call stop on exit. If the thread is still waiting for
+    the endpoint after STOP_TIMEOUT, the pending reports are spooled by stop itself, including the one being sent.
+    """
+    BATCH_DELAY = 2
+    REPLAY_INTERVAL = 60
+    REQUEST_TIMEOUT = 5
+    STOP_TIMEOUT = 2
+
+    _STOP = object()
+
+    def __init__(self, spool_path: str, is_enabled: Callable[[], bool] = lambda: True):
+        """
+        :param spool_path: path of the JSON file keeping the undelivered reports
+        :param is_enabled: called from the reporter thread before sending, spooled reports are kept while it is False
+        """
+        self.spool_path = spool_path
+        self.is_enabled = is_enabled
+        self.queue = queue.Queue()
+        # Undelivered reports by (endpoint, exception), each with count, first_seen and last_seen
+        self.reports: Dict[Tuple[str, str], dict] = {}
+        # Guards reports and the spool, which stop writes if the thread does not finish in time
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ExceptionReporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join(self.STOP_TIMEOUT)
+
+        if self._thread.is_alive():
+            # Waiting for the endpoint, spool everything pending, a report sent meanwhile is only sent twice
+            logging.warning("Exception reporter did not stop in time, spooling the pending reports")
+            with self._lock:
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not self._STOP:
+                        self._add_report(*item)
+                self._write_spool()
+            # Let the thread exit once the request completes
+            self.queue.put(self._STOP)
+        self._thread = None
+
+    def report(self, endpoint: str, exception: str):
+        """
+        Queue a report, returns immediately. Safe to call from any thread
+
+        :param endpoint: URL the report is POSTed to
+        :param exception: formatted traceback of the exception
+        """
+        self.queue.put((endpoint, exception, time.time()))
+
+    def _run(self):
+        self._load_spool()
+
+        while True:
+            # Without new reports, wake up to replay the spooled ones
+            timeout = self.REPLAY_INTERVAL if self.reports else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            # Collect the reports of the batch, e.g. the same exception raised by every timer tick
+            deadline = time.monotonic() + self.BATCH_DELAY
+            while item is not None:
+                if item is self._STOP:
+                    with self._lock:
+                        self._write_spool()
+                    return
+                with self._lock:
+                    self._add_report(*item)
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    item = None
+
+            self._send_reports()
+
+    def _add_report(self, endpoint: str, exception: str, timestamp: float):
+        report = self.reports.get((endpoint, exception))
+        if report is None:
+            self.reports[(endpoint, exception)] = {"count": 1, "first_seen": timestamp, "last_seen": timestamp}
+        else:
+            report["count"] += 1
+            report["last_seen"] = timestamp
+
+    def _send_reports(self):
+        if not self.is_enabled():
+            # Keep the spooled reports, until reporting is enabled again
+            with self._lock:
+                self._write_spool()
+            return
+
+        with self._lock:
+            reports = [(key, dict(report)) for key, report in self.reports.items()]
+
+        for (endpoint, exception), report in reports:
+            try:
+                response = requests.post(
+                    endpoint, json={"exception": exception, **report}, timeout=self.REQUEST_TIMEOUT
+                )
+                # Raise a HTTPError if the HTTP request returned an unsuccessful status code
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    # The endpoint refuses the report, sending it again would not help
+                    logging.error(f"Exception report rejected by API: {e}")
+                    self._remove_report(endpoint, exception, report)
+                    continue
+                logging.error(f"Error occurred while sending exception to API, report spooled: {e}")
+                break
+            except requests.RequestException as e:
+                # The endpoint is unreachable, keep the remaining reports for the next replay
+                logging.error(f"Error occurred while sending exception to API, report spooled: {e}")
+                break
+
+            logging.info(f"Uncaught exception logged and stored ({report['count']} occurrences)")
+            self._remove_report(endpoint, exception, report)
+
+        with self._lock:
+            self._write_spool()
+
+    def _remove_report(self, endpoint: str, exception: str, sent_report: dict):
+        with self._lock:
+            report = self.reports.get((endpoint, exception))
+            if report is None:
+                return
+            if report["count"] > sent_report["count"]:
+                # Occurred again while sending, keep the occurrences not sent yet
+                report["count"] -= sent_report["count"]
+                report["first_seen"] = sent_report["last_seen"]
+            else:
+                del self.reports[(endpoint, exception)]
+
+    def _load_spool(self):
+        try:
+            with open(self.spool_path, "r") as file:
+                spooled = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to read spooled exception reports from {self.spool_path}: {e}")
+            return
+
+        for report in spooled:
+            self.reports[(report.pop("endpoint"), report.pop("exception"))] = report
+
+    def _write_spool(self):
+        try:
+            if not self.reports:
+                if os.path.exists(self.spool_path):
+                    os.remove(self.spool_path)
+                return
+
+            spooled = [
+                {"endpoint": endpoint, "exception": exception, **report}
+                for (endpoint, exception), report in self.reports.items()
+            ]
+            # Write a temporary file first, so an interrupted write does not lose the spooled reports
+            os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+            temporary_path = f"{self.spool_path}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(spooled, file)
+            os.replace(temporary_path, self.spool_path)
+        except OSError as e:
+            logging.error(f"Failed to spool exception reports to {self.spool_path}: {e}")
@@ -0,0 +1,19 @@
+import logging
+
+
+class LogFileFormatter(logging.Formatter):
+    """
+    Formatter of the log files and the console. Records of devices carry the device ID in brackets before
+    the message, so the log files can be searched by device, see LogIndexer
+    """
+    FORMAT = "%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s - %(message)s"
+    DEVICE_FORMAT = "%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s - [%(device_id)s] %(message)s"
+
+    def __init__(self):
+        super().__init__(self.FORMAT)
+        self.device_formatter = logging.Formatter(self.DEVICE_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        if hasattr(record, "device_id"):
+            return self.device_formatter.format(record)
+        return super().format(record)
@@ -0,0 +1,303 @@
+import glob
+import locale
+import logging
+import os
+import re
+import threading
+import time
+from typing import List, Tuple, Dict, Set, Optional
+
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+
+class LogIndexCache:
+    """
+    Indices of the log files and the device IDs they refer to, kept between indexing runs. Shared by the indexers
+    running in their threads, so every access holds the lock, and the indexers hand out copies of it only.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Append-only, so the device indices stay valid in the cached file indices
+        self.devices: List[str] = []
+        self.device_indices: Dict[str, int] = {}
+        # (size, modification time, records) of the indexed files by identity
+        self.file_indices: Dict[Tuple[int, int], Tuple[int, int, np.ndarray]] = {}
+
+
+class LogIndexer(QObject):
+    """
+    Builds an index of the records in the log file and its rotated archives, meant to be moved to a QThread
+    and started with run().
+
+    Every record is indexed by its timestamp, level and device ID, together with the file, offset and length of its
+    text, so records can be searched without reading the files, and only the text of the shown records is read.
+    Lines not starting with a record header, e.g. tracebacks, belong to the preceding record.
+
+    Rotated files do not change, only get renamed on every rollover, so their indices are cached by file identity,
+    and each of them is parsed only once per application run, see LogIndexCache. The current file only grows, so only the part
+    appended since its cached index was built is parsed. Entries of files which no longer exist are dropped.
+    Records are located by file identity when read, so rollovers after the index was built are followed.
+    """
+    progress = pyqtSignal(int)  # percent of bytes indexed
+    index_finished = pyqtSignal(int)  # number of records indexed
+    index_failed = pyqtSignal(str)
+    index_canceled = pyqtSignal()
+
+    RECORD_DTYPE = np.dtype([
+        ("timestamp", "<f8"),  # UNIX timestamp
+        ("offset", "<i8"),  # of the record text in the file, in bytes
+        ("length", "<i4"),  # of the record text, in bytes
+        ("file", "<i4"),  # index in files
+        ("level", "<i1"),
+        ("device", "<i4")  # index in devices, -1 for records not logged by devices
+    ])
+
+    # Header of the lines written by LogFileFormatter, with or without the device ID. Device IDs have the form
+    # "<device> @ <address>", see DeviceBase.device_id, so other bracketed text starting a message is not taken for one
+    HEADER_PATTERN = re.compile(
+        rb"(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d{3}) - .+?:\d+ - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - "
+        rb"(?:\[([^\[\]\r\n]+? @ [^\[\]\r\n]*)\] )?"
+    )
+    LEVELS = {
+        b"DEBUG": logging.DEBUG,
+        b"INFO": logging.INFO,
+        b"WARNING": logging.WARNING,
+        b"ERROR": logging.ERROR,
+        b"CRITICAL": logging.CRITICAL
+    }
+
+    # Shared by all indexers
+    cache = LogIndexCache()
+
+    def __init__(self, log_file: str):
+        """
+        :param log_file: path of the current log file, rotated archives are found next to it
+        """
+        super().__init__()
+        self.log_file = log_file
+        # Log files are written with the default encoding of the platform
+        self.encoding = locale.getpreferredencoding(False)
+
+        self.records = np.empty(0, dtype=self.RECORD_DTYPE)
+        # (path, identity) of every indexed file, oldest first
+        self.files: List[Tuple[str, Tuple[int, int]]] = []
+        # Snapshot of the cached device IDs, covering every device index in records once the index is built
+        self.devices: List[str] = []
+        self.device_indices: Dict[str, int] = {}
+
+        self._canceled = False
+        self._second_timestamps: Dict[bytes, float] = {}
+
+    def cancel(self):
+        """
+        Request the indexing to stop after the current file. Safe to call from any thread
+        """
+        self._canceled = True
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            self.build_index()
+        except OSError as e:
+            logging.error(f"Indexing of {self.log_file} failed: {e}")
+            self.index_failed.emit(str(e))
+            return
+
+        if self._canceled:
+            self.index_canceled.emit()
+            return
+
+        logging.debug(f"Indexed {len(self.records)} log records in {len(self.files)} files")
+        self.index_finished.emit(len(self.records))
+
+    def build_index(self):
+        paths = self.log_files()
+        stats = [os.stat(path) for path in paths]
+        total_bytes = max(sum(stat.st_size for stat in stats), 1)
+        indexed_bytes = 0
+
+        with self.cache.lock:
+            self.device_indices = dict(self.cache.device_indices)
+
+        file_indices = []
+        for path, stat in zip(paths, stats):
+            if self._canceled:
+                return
+
+            identity = (stat.st_dev, stat.st_ino)
+            records = self._cached_index(path, identity, stat)
+
+            file_index = records.copy()
+            file_index["file"] = len(self.files)
+            file_indices.append(file_index)
+            self.files.append((path, identity))
+
+            indexed_bytes += stat.st_size
+            self.progress.emit(int(indexed_bytes / total_bytes * 100))
+
+        # Forget files removed since, e.g. the oldest archive on rollover
+        identities = {identity for _, identity in self.files}
+        with self.cache.lock:
+            for identity in list(self.cache.file_indices):
+                if identity not in identities:
+                    del self.cache.file_indices[identity]
+            # Including devices found by other indexers meanwhile, to match the cached file indices used
+            self.devices = list(self.cache.devices)
+            self.device_indices = dict(self.cache.device_indices)
+
+        if file_indices:
+            records = np.concatenate(file_indices)
+            # Files are in chronological order already, sort in case the clock was changed
+            self.records = records[np.argsort(records["timestamp"], kind="stable")]
+
+    def log_files(self) -> List[str]:
+        """
+        :return: paths of the rotated archives, oldest first, followed by the current log file
+        """
+        rotated = []
+        for path in glob.glob(glob.escape(self.log_file) + ".*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                rotated.append((int(suffix), path))
+
+        paths = [path for _, path in sorted(rotated, reverse=True)]
+        if os.path.exists(self.log_file):
+            paths.append(self.log_file)
+        return paths
+
+    def _cached_index(self, path: str, identity: Tuple[int, int], stat: os.stat_result) -> np.ndarray:
+        with self.cache.lock:
+            cached = self.cache.file_indices.get(identity)
+        # Parsed without holding the lock, another indexer storing the same file meanwhile is harmless
+        if cached is not None:
+            size, mtime, records = cached
+            if (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+                return records
+
+            if stat.st_size > size:
+                # Appended to, parse again from the last record, which may have been continued, e.g. by a traceback
+                start = int(records["offset"][-1]) if len(records) else 0
+                records = np.concatenate([records[records["offset"] < start], self.index_file(path, start)])
+                with self.cache.lock:
+                    self.cache.file_indices[identity] = (stat.st_size, stat.st_mtime_ns, records)
+                return records
+
+        # Not indexed yet, or truncated
+        records = self.index_file(path)
+        with self.cache.lock:
+            self.cache.file_indices[identity] = (stat.st_size, stat.st_mtime_ns, records)
+        return records
+
+    def index_file(self, path: str, start: int = 0) -> np.ndarray:
+        """
+        :param start: offset in bytes of the first line to parse
+        :return: RECORD_DTYPE records of a log file, with the file field not set
+        """
+        timestamps, offsets, lengths, levels, devices = [], [], [], [], []
+
+        offset = start
+        with open(path, "rb") as file:
+            file.seek(start)
+            for line in file:
+                header = self.HEADER_PATTERN.match(line)
+                if header is not None:
+                    timestamps.append(self._timestamp(header[1], header[2]))
+                    offsets.append(offset)
+                    lengths.append(len(line))
+                    levels.append(self.LEVELS[header[3]])
+                    devices.append(self._device_index(header[4]))
+                elif lengths:
+                    lengths[-1] += len(line)
+                offset += len(line)
+
+        records = np.empty(len(timestamps), dtype=self.RECORD_DTYPE)
+        records["timestamp"] = timestamps
+        records["offset"] = offsets
+        records["length"] = lengths
+        records["file"] = 0
+        records["level"] = levels
+        records["device"] = devices
+        return records
+
+    def query(self, start: float, end: float, min_level: int, device_ids: Set[str]) -> np.ndarray:
+        """
+        :param start: UNIX timestamp of the range start
+        :param end: UNIX timestamp of the range end, inclusive
+        :param min_level: records of lower levels are skipped
+        :param device_ids: IDs of the devices to include records of, all records if empty
+        :return: RECORD_DTYPE records matching the criteria, newest first
+        """
+        timestamps = self.records["timestamp"]
+        records = self.records[
+            np.searchsorted(timestamps, start, side="left"):np.searchsorted(timestamps, end, side="right")
+        ]
+
+        matching = records["level"] >= min_level
+        if device_ids:
+            device_indices = [self.device_indices[device_id] for device_id in device_ids
+                              if device_id in self.device_indices]
+            matching &= np.isin(records["device"], device_indices)
+
+        return records[matching][::-1]
+
+    def read_records(self, records: np.ndarray) -> List[str]:
+        """
+        Read the text of indexed records, opening every file once
+
+        :param records: RECORD_DTYPE records returned by query
+        :return: text of every record, or a note if its file no longer exists
+        """
+        texts = [""] * len(records)
+        for file in np.unique(records["file"]):
+            positions = np.flatnonzero(records["file"] == file)
+            path = self._locate_file(file)
+            if path is None:
+                for position in positions:
+                    texts[position] = "<log file removed>"
+                continue
+
+            with open(path, "rb") as log_file:
+                for position in positions:
+                    log_file.seek(records["offset"][position])
+                    text = log_file.read(records["length"][position])
+                    texts[position] = text.decode(self.encoding, errors="replace").rstrip("\r\n")
+        return texts
+
+    def _locate_file(self, file: int) -> Optional[str]:
+        # Find the file under its current name, it is renamed on every rollover
+        path, identity = self.files[file]
+        for candidate in [path] + self.log_files():
+            try:
+                stat = os.stat(candidate)
+            except OSError:
+                continue
+            if (stat.st_dev, stat.st_ino) == identity:
+                self.files[file] = (candidate, identity)
+                return candidate
+        return None
+
+    def _timestamp(self, seconds: bytes, milliseconds: bytes) -> float:
+        # Many records share a second, so the date is parsed once per second
+        timestamp = self._second_timestamps.get(seconds)
+        if timestamp is None:
+            timestamp = time.mktime(time.strptime(seconds.decode("ascii"), "%Y-%m-%d %H:%M:%S"))
+            self._second_timestamps[seconds] = timestamp
+        return timestamp + int(milliseconds) / 1000
+
+    def _device_index(self, device_id: Optional[bytes]) -> int:
+        if device_id is None:
+            return -1
+
+        device_id = device_id.decode(self.encoding, errors="replace")
+        # Looked up in the snapshot first, the lock is only taken for devices new to this indexer
+        index = self.device_indices.get(device_id)
+        if index is None:
+            with self.cache.lock:
+                index = self.cache.device_indices.get(device_id)
+                if index is None:
+                    index = len(self.cache.devices)
+                    self.cache.devices.append(device_id)
+                    self.cache.device_indices[device_id] = index
+            self.device_indices[device_id] = index
+        return index
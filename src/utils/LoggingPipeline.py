@@ -0,0 +1,100 @@
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the logging thread: if the queue is full, the record is dropped and counted
+    """
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class LoggingPipeline(QueueListener):
+    """
+    Moves all log output off the threads that log. The root logger only puts records into a bounded queue,
+    and a single listener thread passes them to the sinks, e.g. the log file, console and the log viewer.
+
+    Records that do not fit into the queue are dropped rather than blocking e.g. a worker timing a serial
+    transaction, and the number of dropped records is reported through the sinks once the queue has space again.
+
+    The pipeline is not stopped on exit automatically, the application stops it after the components which
+    still log on exit, see main.py. Sinks added with add_handler, e.g. the log viewer, are removed on stop,
+    and only the sinks given to install receive the records remaining in the queue.
+    """
+    QUEUE_SIZE = 10000
+
+    _instance: Optional["LoggingPipeline"] = None
+
+    def __init__(self, *handlers: logging.Handler, queue_size: int = QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size), *handlers, respect_handler_level=True)
+        self.queue_handler = DroppingQueueHandler(self.queue)
+        self.reported_dropped = 0
+        self.installed_handlers = self.handlers
+
+    @classmethod
+    def install(cls, *handlers: logging.Handler) -> "LoggingPipeline":
+        """
+        Route the records of the root logger through a new pipeline to the given sinks, and start the listener.
+        Call stop on exit to write out the queued records
+
+        :param handlers: sinks of the records, their levels and formatters are respected
+        :return: the installed pipeline
+        """
+        pipeline = cls(*handlers)
+        logging.getLogger().addHandler(pipeline.queue_handler)
+        pipeline.start()
+
+        cls._instance = pipeline
+        return pipeline
+
+    @classmethod
+    def instance(cls) -> Optional["LoggingPipeline"]:
+        """
+        :return: the installed pipeline, or None if the root logger writes to its handlers directly
+        """
+        return cls._instance
+
+    def add_handler(self, handler: logging.Handler):
+        # The listener thread reads the tuple of handlers for every record, replacing it is atomic
+        self.handlers = self.handlers + (handler,)
+
+    def remove_handler(self, handler: logging.Handler):
+        self.handlers = tuple(h for h in self.handlers if h is not handler)
+
+    def handle(self, record: logging.LogRecord):
+        super().handle(record)
+
+        dropped = self.queue_handler.dropped
+        if dropped > self.reported_dropped:
+            warning = logging.LogRecord(
+                "root", logging.WARNING, __file__, 0,
+                f"Dropped {dropped - self.reported_dropped} log records, the logging queue was full", None, None
+            )
+            self.reported_dropped = dropped
+            super().handle(warning)
+
+    def stop(self):
+        # Sinks added later may not outlive the application, e.g. a Qt handler of a dialog
+        self.handlers = self.installed_handlers
+
+        # Stopping twice is harmless
+        if self._thread is not None:
+            super().stop()
+
+    def enqueue_sentinel(self):
+        # Unlike records, the stop request must not be dropped, so wait for space in the queue
+        self.queue.put(self._sentinel)
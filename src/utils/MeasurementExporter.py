@@ -0,0 +1,498 @@
+import csv
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import zipfile
+from datetime import datetime
+from typing import List, Tuple, Dict
+
+import numpy as np
+import xlsxwriter
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from src.utils.MeasurementSeries import MeasurementSeries
+
+
+class MeasurementExporter(QObject):
+    """
+    Writes samples of measurement series to a file, meant to be moved to a QThread and started with run().
+
+    The samples are selected by binary search on the timestamps. Text formats are written in chunks of CHUNK_SIZE
+    rows, each formatted with vectorized numpy operations, binary formats are written array by array. In between
+    the progress is reported, and the cancellation flag is checked, in which case the partial output is removed.
+
+    The "excel" format is written in xlsxwriter's constant_memory mode, with a worksheet per device, where every
+    measure takes a pair of columns, timestamps as native Excel datetimes and values. Devices with more samples
+    than fit on a worksheet continue on further worksheets.
+
+    The "csv_wide" format has one row per timestamp of a common time grid, and one column per measure. The grid is
+    generated chunk by chunk, and limited to CSV_WIDE_MAX_ROWS rows. The value of a measure at a grid timestamp is
+    found by binary search of all grid timestamps of the chunk at once, and is either the last sample at or before it,
+    or linearly interpolated between the neighbouring samples.
+
+    Binary formats store every measure as arrays of int64 nanoseconds since the UNIX epoch, float64 values, and
+    float64 minimums and maximums, which differ from the values where samples were compacted into bucket means,
+    together with a JSON manifest naming the devices, measures and units of the arrays. The "npz" format
+    is a single uncompressed numpy.load-able archive, the "npy" format is a directory of .npy files, which can be
+    loaded with numpy.load(..., mmap_mode="r").
+    """
+    progress = pyqtSignal(int)  # percent of rows written
+    export_finished = pyqtSignal(int)  # number of rows written
+    export_failed = pyqtSignal(str)
+    export_canceled = pyqtSignal()
+
+    CHUNK_SIZE = 100000
+    # Limit of the rows of the "csv_wide" format, a fine grid over a long range would produce an unusable file
+    CSV_WIDE_MAX_ROWS = 50000000
+    CSV_HEADERS = ["Device", "Measurement", "Timestamp", "Value"]
+
+    MANIFEST_NAME = "manifest.json"
+    MANIFEST_VERSION = 2
+
+    # Maximum number of rows of an Excel worksheet, the first one is taken by the header
+    EXCEL_MAX_ROWS = 1048576
+    EXCEL_MAX_SHEET_NAME_LENGTH = 31
+    # Days between the Excel epoch (1899-12-30) and the UNIX epoch
+    EXCEL_UNIX_EPOCH = 25569
+
+    def __init__(
+            self,
+            path: str,
+            channels: List[Tuple[str, str, MeasurementSeries]],
+            start_timestamp: float,
+            end_timestamp: float,
+            file_format: str = "csv",
+            grid_step: float = 0,
+            interpolate: bool = False
+    ):
+        """
+        :param path: path of the created file, or directory for the "npy" format
+        :param channels: list of (device, measurement, series) tuples to export
+        :param start_timestamp: UNIX timestamp of the start of the exported range
+        :param end_timestamp: UNIX timestamp of the end of the exported range, inclusive
+        :param file_format: one of "csv", "excel", "npz", "npy", "csv_wide"
+        :param grid_step: "csv_wide" only, step of the time grid in seconds, 0 to use timestamps of all samples
+        :param interpolate: "csv_wide" only, whether to interpolate values, instead of taking the previous sample
+        """
+        super().__init__()
+        self.path = path
+        self.file_format = file_format
+        self.grid_step = grid_step
+        self.interpolate = interpolate
+        self.start_timestamp = start_timestamp
+        self.end_timestamp = end_timestamp
+
+        # Take the samples now, in the thread that owns the series, the returned views stay valid after appends
+        self.channels = [
+            (device, measurement, series.unit, *series.query(start_timestamp, end_timestamp))
+            for device, measurement, series in channels
+        ]
+        # Extremes of the compacted samples, written by the binary formats only
+        self.extremes = [
+            series.query_extremes(start_timestamp, end_timestamp) for _, _, series in channels
+        ] if file_format in ("npz", "npy") else []
+        self.total_rows = sum(len(timestamps) for _, _, _, timestamps, _ in self.channels)
+        self.rows_written = 0
+        # "csv_wide" without a grid step only, distinct timestamps of the samples, see time_grid_range
+        self._sample_grid = np.empty(0)
+
+        self._canceled = False
+        # Set once the output is created, so an existing directory is never removed on failure
+        self._output_created = False
+
+    def cancel(self):
+        """
+        Request the export to stop after the current chunk. Safe to call from any thread
+        """
+        self._canceled = True
+
+    @pyqtSlot()
+    def run(self):
+        logging.debug(f"Exporting {self.total_rows} rows to {self.path}")
+        try:
+            if self.file_format == "excel":
+                self.export_excel()
+            elif self.file_format == "npz":
+                self.export_npz()
+            elif self.file_format == "npy":
+                self.export_npy()
+            elif self.file_format == "csv_wide":
+                self.export_csv_wide()
+            else:
+                self.export_csv()
+        except Exception as e:
+            logging.error(f"Export to {self.path} failed: {e}")
+            self._remove_partial_output()
+            self.export_failed.emit(str(e))
+            return
+
+        if self._canceled:
+            logging.debug(f"Export to {self.path} canceled")
+            self._remove_partial_output()
+            self.export_canceled.emit()
+            return
+
+        logging.debug(f"Export done, written {self.rows_written} rows")
+        self.export_finished.emit(self.rows_written)
+
+    def export_csv(self):
+        with open(self.path, "w", newline="") as file:
+            self._output_created = True
+            writer = csv.writer(file)
+            writer.writerow(self.CSV_HEADERS)
+
+            for device, measurement, _, timestamps, values in self.channels:
+                # The device and measurement columns are the same for every row, so they are quoted by csv only once
+                buffer = io.StringIO()
+                csv.writer(buffer, lineterminator="").writerow([device, measurement, ""])
+                prefix = buffer.getvalue()
+
+                for start in range(0, len(timestamps), self.CHUNK_SIZE):
+                    if self._canceled:
+                        return
+
+                    chunk_timestamps = timestamps[start:start + self.CHUNK_SIZE]
+                    chunk_values = values[start:start + self.CHUNK_SIZE]
+
+                    # Both columns are formatted by numpy, leaving only the concatenation of the lines
+                    file.write("".join([
+                        f"{prefix}{timestamp},{value}\r\n" for timestamp, value in zip(
+                            self.format_timestamps(chunk_timestamps).tolist(), chunk_values.astype(str).tolist()
+                        )
+                    ]))
+
+                    self._chunk_written(len(chunk_timestamps))
+
+    def export_csv_wide(self):
+        first_row, rows = self.time_grid_range()
+        if rows > self.CSV_WIDE_MAX_ROWS:
+            raise ValueError(
+                f"The time grid has {rows} rows, more than {self.CSV_WIDE_MAX_ROWS}, "
+                f"choose a longer step or a shorter range"
+            )
+        self.total_rows = rows
+
+        # Timestamps with fractions of a second, e.g. of a sub-second grid, are written with milliseconds
+        if self.grid_step == 0:
+            timestamp_unit = "ms" if np.any(np.round(self._sample_grid, 3) % 1) else "s"
+        else:
+            timestamp_unit = "ms" if np.round(self.grid_step, 3) % 1 else "s"
+
+        with open(self.path, "w", newline="") as file:
+            self._output_created = True
+            csv.writer(file).writerow(["Timestamp"] + [
+                f"{device} - {measurement} [{unit}]" if unit else f"{device} - {measurement}"
+                for device, measurement, unit, _, _ in self.channels
+            ])
+
+            # The grid is generated chunk by chunk, so its length is not limited by memory
+            for start in range(0, rows, self.CHUNK_SIZE):
+                if self._canceled:
+                    return
+
+                chunk_grid = self.time_grid_chunk(first_row, start, min(start + self.CHUNK_SIZE, rows))
+                columns = [self.format_timestamps(chunk_grid, timestamp_unit).tolist()]
+                for _, _, _, timestamps, values in self.channels:
+                    aligned = self.align(chunk_grid, timestamps, values)
+                    # Timestamps without a value are left empty
+                    columns.append(np.where(np.isnan(aligned), "", aligned.astype(str)).tolist())
+
+                # Every column is formatted by numpy, leaving only the concatenation of the cells
+                file.write("".join([",".join(row) + "\r\n" for row in zip(*columns)]))
+
+                self._chunk_written(len(chunk_grid))
+
+    def time_grid_range(self) -> Tuple[int, int]:
+        """
+        Find the rows of the "csv_wide" format, covering the exported samples. Without a grid step, the rows are
+        the distinct timestamps of the samples, otherwise the multiples of the step, so they are round numbers.
+
+        :return: (index of the first multiple of the grid step, number of rows), the first is 0 without a grid step
+        """
+        sample_timestamps = [timestamps for _, _, _, timestamps, _ in self.channels if len(timestamps) > 0]
+        if not sample_timestamps:
+            return 0, 0
+
+        if self.grid_step == 0:
+            self._sample_grid = np.unique(np.concatenate(sample_timestamps))
+            return 0, len(self._sample_grid)
+
+        first = min(timestamps[0] for timestamps in sample_timestamps)
+        last = max(timestamps[-1] for timestamps in sample_timestamps)
+        first_row = int(np.ceil(first / self.grid_step))
+        return first_row, max(int(np.floor(last / self.grid_step)) + 1 - first_row, 0)
+
+    def time_grid_chunk(self, first_row: int, start: int, end: int) -> np.ndarray:
+        """
+        :param first_row: index of the first multiple of the grid step, returned by time_grid_range
+        :return: timestamps of the rows [start, end) of the "csv_wide" format
+        """
+        if self.grid_step == 0:
+            return self._sample_grid[start:end]
+        return np.arange(first_row + start, first_row + end) * self.grid_step
+
+    def align(self, grid: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        As-of join of the samples of a measure onto a time grid
+
+        :return: value of the measure at every grid timestamp, NaN where there is no sample to take it from
+        """
+        if len(timestamps) == 0:
+            return np.full(len(grid), np.nan)
+
+        if self.interpolate:
+            return np.interp(grid, timestamps, values, left=np.nan, right=np.nan)
+
+        # Index of the last sample at or before every grid timestamp, -1 if there is none
+        indices = np.searchsorted(timestamps, grid, side="right") - 1
+        return np.where(indices >= 0, values[np.maximum(indices, 0)], np.nan)
+
+    def export_excel(self):
+        # Group the measures by device, keeping the order of the devices
+        devices: Dict[str, List[Tuple[str, str, np.ndarray, np.ndarray]]] = {}
+        for device, measurement, unit, timestamps, values in self.channels:
+            devices.setdefault(device, []).append((measurement, unit, timestamps, values))
+
+        # Constant memory mode flushes every row once the next one is started, so rows must be written in order
+        workbook = xlsxwriter.Workbook(self.path, {"constant_memory": True, "nan_inf_to_errors": True})
+        self._output_created = True
+        try:
+            header_format = workbook.add_format({"bold": True})
+            date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+            sheet_names = set()
+
+            for device, measures in devices.items():
+                rows = max(len(timestamps) for _, _, timestamps, _ in measures)
+                rows_per_sheet = self.EXCEL_MAX_ROWS - 1
+
+                # Devices without samples in range still get a worksheet with the header
+                for sheet_start in range(0, max(rows, 1), rows_per_sheet):
+                    worksheet = workbook.add_worksheet(self.excel_sheet_name(device, sheet_names))
+                    worksheet.set_column(0, 2 * len(measures) - 1, 20)
+
+                    for column, (measurement, unit, _, _) in enumerate(measures):
+                        worksheet.write_string(0, 2 * column, f"{measurement} timestamp", header_format)
+                        worksheet.write_string(
+                            0, 2 * column + 1, f"{measurement} [{unit}]" if unit else measurement, header_format
+                        )
+
+                    if not self._write_excel_rows(worksheet, measures, sheet_start, rows_per_sheet, date_format):
+                        return
+        finally:
+            workbook.close()
+
+    def _write_excel_rows(self, worksheet, measures: List[Tuple[str, str, np.ndarray, np.ndarray]],
+                          sheet_start: int, rows_per_sheet: int, date_format) -> bool:
+        """
+        Write samples [sheet_start, sheet_start + rows_per_sheet) of every measure into a worksheet, chunk by chunk
+
+        :return: False if the export was canceled
+        """
+        sheet_end = min(sheet_start + rows_per_sheet, max(len(timestamps) for _, _, timestamps, _ in measures))
+        for chunk_start in range(sheet_start, sheet_end, self.CHUNK_SIZE):
+            if self._canceled:
+                return False
+
+            chunk_end = min(chunk_start + self.CHUNK_SIZE, sheet_end)
+
+            # Convert every column of the chunk at once, leaving only the cell writes for the row loop
+            columns = [
+                (
+                    self.timestamps_to_excel(timestamps[chunk_start:chunk_end]).tolist(),
+                    values[chunk_start:chunk_end].tolist()
+                )
+                for _, _, timestamps, values in measures
+            ]
+
+            row_offset = chunk_start - sheet_start + 1
+            written = 0
+            for row in range(chunk_end - chunk_start):
+                for column, (excel_timestamps, column_values) in enumerate(columns):
+                    if row < len(excel_timestamps):
+                        worksheet.write_number(row + row_offset, 2 * column, excel_timestamps[row], date_format)
+                        worksheet.write_number(row + row_offset, 2 * column + 1, column_values[row])
+                        written += 1
+
+            self._chunk_written(written)
+
+        return True
+
+    def excel_sheet_name(self, device: str, used_names: set) -> str:
+        """
+        Create a valid, unique worksheet name for a device, and add it to used_names
+
+        :param device: device ID
+        :param used_names: lowercase names of worksheets already in the workbook
+        """
+        # Excel forbids some characters in worksheet names, and compares the names case-insensitively
+        base_name = re.sub(r"[\[\]:*?/\\]", "_", device).strip("'") or "Device"
+        name = base_name[:self.EXCEL_MAX_SHEET_NAME_LENGTH]
+
+        number = 2
+        while name.lower() in used_names:
+            suffix = f" ({number})"
+            name = base_name[:self.EXCEL_MAX_SHEET_NAME_LENGTH - len(suffix)] + suffix
+            number += 1
+
+        used_names.add(name.lower())
+        return name
+
+    def export_npz(self):
+        # Written like numpy.savez, but array by array, to report progress and check for cancellation in between
+        with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            self._output_created = True
+            archive.writestr(self.MANIFEST_NAME, self.create_manifest())
+
+            for index, (_, _, _, timestamps, _) in enumerate(self.channels):
+                if self._canceled:
+                    return
+
+                for name, array in self.channel_arrays(index):
+                    with archive.open(f"{name}.npy", "w", force_zip64=True) as file:
+                        np.lib.format.write_array(file, array)
+
+                self._chunk_written(len(timestamps))
+
+    def export_npy(self):
+        os.makedirs(self.path)
+        self._output_created = True
+
+        with open(os.path.join(self.path, self.MANIFEST_NAME), "w", encoding="utf-8") as file:
+            file.write(self.create_manifest())
+
+        for index, (_, _, _, timestamps, _) in enumerate(self.channels):
+            if self._canceled:
+                return
+
+            for name, array in self.channel_arrays(index):
+                np.save(os.path.join(self.path, f"{name}.npy"), array)
+
+            self._chunk_written(len(timestamps))
+
+    def channel_arrays(self, index: int) -> List[Tuple[str, np.ndarray]]:
+        """
+        :return: (name, array) of every array written by the binary formats for the channel with given index
+        """
+        _, _, _, timestamps, values = self.channels[index]
+        minimums, maximums = self.extremes[index]
+        timestamps_name, values_name, minimums_name, maximums_name = self.array_names(index)
+        return [
+            (timestamps_name, self.timestamps_to_ns(timestamps)),
+            (values_name, np.ascontiguousarray(values, dtype=np.float64)),
+            # Samples appended between the queries are not part of the export
+            (minimums_name, np.ascontiguousarray(minimums[:len(timestamps)], dtype=np.float64)),
+            (maximums_name, np.ascontiguousarray(maximums[:len(timestamps)], dtype=np.float64))
+        ]
+
+    def create_manifest(self) -> str:
+        """
+        :return: JSON describing the exported range, and the device, measure, unit and array names of every channel
+        """
+        channels = []
+        for index, (device, measurement, unit, timestamps, _) in enumerate(self.channels):
+            timestamps_name, values_name, minimums_name, maximums_name = self.array_names(index)
+            channels.append({
+                "device": device,
+                "measurement": measurement,
+                "unit": unit,
+                "samples": len(timestamps),
+                "timestamps": timestamps_name,
+                "values": values_name,
+                "minimums": minimums_name,
+                "maximums": maximums_name
+            })
+
+        return json.dumps({
+            "version": self.MANIFEST_VERSION,
+            "start": self.start_timestamp,
+            "end": self.end_timestamp,
+            "timestamp_unit": "ns",
+            "channels": channels
+        }, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def array_names(index: int) -> Tuple[str, str, str, str]:
+        """
+        :return: names of the timestamps, values, minimums and maximums arrays of the channel with given index
+        """
+        return (
+            f"channel_{index}_timestamps", f"channel_{index}_values",
+            f"channel_{index}_minimums", f"channel_{index}_maximums"
+        )
+
+    @staticmethod
+    def timestamps_to_ns(timestamps: np.ndarray) -> np.ndarray:
+        """
+        :return: UNIX timestamps in seconds converted to int64 nanoseconds since the UNIX epoch
+        """
+        # Whole seconds and the fraction are converted separately, scaling the whole timestamp would lose precision
+        seconds = np.floor(timestamps)
+        return seconds.astype(np.int64) * 1000000000 + np.round((timestamps - seconds) * 1e9).astype(np.int64)
+
+    @staticmethod
+    def utc_offsets(timestamps: np.ndarray) -> np.ndarray:
+        """
+        :return: offsets of the local time from UTC in seconds at the given UNIX timestamps
+        """
+        def utc_offset(timestamp: float) -> float:
+            return datetime.fromtimestamp(timestamp).astimezone().utcoffset().total_seconds()
+
+        # The UTC offset changes rarely, so it is looked up at the start and the end of every distinct hour
+        hours, hour_indices = np.unique(timestamps // 3600, return_inverse=True)
+        hour_starts = np.array([utc_offset(hour * 3600) for hour in hours])
+        hour_ends = np.array([utc_offset(hour * 3600 + 3599) for hour in hours])
+        offsets = hour_starts[hour_indices]
+
+        # Transitions are not always on full hours, e.g. on half hours in Australia/Lord_Howe, but are on full
+        # minutes, so in the hours containing a transition the offset is looked up for every distinct minute
+        in_transition = np.isin(hour_indices, np.flatnonzero(hour_starts != hour_ends))
+        if np.any(in_transition):
+            minutes, minute_indices = np.unique(timestamps[in_transition] // 60, return_inverse=True)
+            offsets[in_transition] = np.array([utc_offset(minute * 60) for minute in minutes])[minute_indices]
+        return offsets
+
+    @classmethod
+    def timestamps_to_excel(cls, timestamps: np.ndarray) -> np.ndarray:
+        """
+        :return: UNIX timestamps converted to Excel serial dates in local time
+        """
+        return (timestamps + cls.utc_offsets(timestamps)) / 86400 + cls.EXCEL_UNIX_EPOCH
+
+    @classmethod
+    def format_timestamps(cls, timestamps: np.ndarray, unit: str = "s") -> np.ndarray:
+        """
+        Format UNIX timestamps as local time "%Y-%m-%d %H:%M:%S" strings, without a Python call per timestamp
+
+        :param unit: "s", or "ms" to append milliseconds, as "%Y-%m-%d %H:%M:%S.fff"
+        :return: array of strings
+        """
+        # Like datetime.fromtimestamp, round to microseconds before truncating to the unit
+        scale = 1000 if unit == "ms" else 1
+        truncated = np.floor(np.round(timestamps, 6) * scale)
+        local = (truncated + cls.utc_offsets(truncated / scale) * scale).astype(f"datetime64[{unit}]")
+
+        # ISO format differs only by the "T" separating the date and the time, which is replaced in place
+        width = 23 if unit == "ms" else 19
+        characters = np.datetime_as_string(local, unit=unit).astype(f"S{width}").view(np.uint8).reshape(-1, width)
+        characters = characters.copy()
+        characters[:, 10] = ord(" ")
+        return characters.view(f"S{width}").ravel().astype(f"U{width}")
+
+    def _chunk_written(self, rows: int):
+        self.rows_written += rows
+        self.progress.emit(int(self.rows_written * 100 / self.total_rows) if self.total_rows else 100)
+
+    def _remove_partial_output(self):
+        if not self._output_created:
+            return
+
+        try:
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+            else:
+                os.remove(self.path)
+        except OSError as e:
+            logging.error(f"Could not remove partial export {self.path}: {e}")
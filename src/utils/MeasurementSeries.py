@@ -0,0 +1,178 @@
+from typing import Tuple, Optional
+
+import numpy as np
+
+from src.utils.MinMaxPyramid import MinMaxPyramid
+
+
+class MeasurementSeries:
+    """
+    A columnar buffer of (timestamp, value) samples of a single measure.
+
+    Timestamps and values are kept in preallocated float64 arrays, which grow by doubling their capacity,
+    so appending a sample is amortized O(1). The timestamps and values properties return zero-copy views of the
+    filled part of the buffers, which can be handed directly to pyqtgraph or numpy.
+
+    A min/max pyramid of the samples is kept alongside, so decimated views of any time range can be drawn
+    at a cost independent of the length of the series.
+
+    Readers can detect changes without comparing samples: the version grows with every modification, and
+    the generation grows only when existing samples are removed or replaced. While the generation stays the same,
+    samples were only appended, so samples from the previously seen length onwards are the new ones.
+    """
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, initial_capacity: int = INITIAL_CAPACITY, unit: str = ""):
+        """
+        :param initial_capacity: number of samples that fit in the buffers before they have to grow
+        :param unit: unit of the values, e.g. "W", reported in exports
+        """
+        self.unit = unit
+
+        self._timestamps = np.empty(initial_capacity, dtype=np.float64)
+        self._values = np.empty(initial_capacity, dtype=np.float64)
+        self._length = 0
+        self._pyramid = MinMaxPyramid()
+
+        self._version = 0
+        self._generation = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def version(self) -> int:
+        """
+        :return: counter increased by every append and clear
+        """
+        return self._version
+
+    @property
+    def generation(self) -> int:
+        """
+        :return: counter increased whenever samples are removed or replaced, e.g. by clear
+        """
+        return self._generation
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """
+        :return: view of UNIX timestamps of all samples, valid until the next append
+        """
+        return self._timestamps[:self._length]
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        :return: view of values of all samples, valid until the next append
+        """
+        return self._values[:self._length]
+
+    def append(self, timestamp: float, value: float):
+        if self._length == len(self._timestamps):
+            self._grow(self._length + 1)
+
+        self._timestamps[self._length] = timestamp
+        self._values[self._length] = value
+        self._length += 1
+        self._version += 1
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        """
+        Append multiple samples at once
+
+        :param timestamps: UNIX timestamps of the samples
+        :param values: values of the samples, same length as timestamps
+        """
+        count = len(timestamps)
+        if self._length + count > len(self._timestamps):
+            self._grow(self._length + count)
+
+        self._timestamps[self._length:self._length + count] = timestamps
+        self._values[self._length:self._length + count] = values
+        self._length += count
+        self._version += count
+
+    def clear(self):
+        # Allocate new buffers instead of rewinding, so views handed out earlier are not overwritten by new samples
+        self._timestamps = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self._values = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self._length = 0
+        self._pyramid.clear()
+        self._version += 1
+        self._generation += 1
+
+    def value_at(self, timestamp: float) -> Optional[float]:
+        """
+        Find the value of the last sample at or before a timestamp by binary search
+
+        :param timestamp: UNIX timestamp
+        :return: the value, or None if there are no samples before the timestamp
+        """
+        index = int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1
+        if index < 0:
+            return None
+        return float(self.values[index])
+
+    def envelope(self, start: float, end: float, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the samples between two timestamps, decimated with the min/max pyramid to about max_points points.
+        The closest sample outside the range on each side is included, so curves reach the edges of the range.
+
+        :param start: UNIX timestamp of the range start
+        :param end: UNIX timestamp of the range end
+        :param max_points: maximum number of points of the result, e.g. the width of the plot in pixels
+        :return: (x, y) arrays of the decimated samples
+        """
+        timestamps = self.timestamps
+        start_index = max(int(np.searchsorted(timestamps, start, side="left")) - 1, 0)
+        end_index = min(int(np.searchsorted(timestamps, end, side="right")) + 1, len(timestamps))
+
+        return self._pyramid.envelope(timestamps, self.values, start_index, end_index, max_points)
+
+    def query(self, start: float, end: float, max_points: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the samples with timestamps in [start, end], located by binary search
+
+        :param start: UNIX timestamp of the range start
+        :param end: UNIX timestamp of the range end
+        :param max_points: if given, decimate the result with the min/max pyramid to about this many points
+        :return: (timestamps, values) arrays, views of the series unless decimation took place
+        """
+        timestamps = self.timestamps
+        start_index = int(np.searchsorted(timestamps, start, side="left"))
+        end_index = int(np.searchsorted(timestamps, end, side="right"))
+
+        if max_points is None or end_index - start_index <= max_points:
+            return timestamps[start_index:end_index], self.values[start_index:end_index]
+
+        x, y = self._pyramid.envelope(timestamps, self.values, start_index, end_index, max_points)
+
+        # Pyramid buckets at the edges can reach outside the range
+        in_range = (x >= start) & (x <= end)
+        return x[in_range], y[in_range]
+
+    def query_extremes(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the lowest and highest value each sample returned by query stands for. Samples of this series are
+        single measurements, so both are the values themselves, but downsampled series return the extremes of
+        the buckets their samples summarize.
+
+        :param start: UNIX timestamp of the range start
+        :param end: UNIX timestamp of the range end
+        :return: (minimums, maximums) arrays, aligned with the arrays returned by query(start, end)
+        """
+        _, values = self.query(start, end)
+        return values, values
+
+    def _grow(self, required_capacity: int):
+        capacity = max(len(self._timestamps) * 2, required_capacity, self.INITIAL_CAPACITY)
+
+        # Allocate new buffers, and copy the current contents. Existing views keep referencing the old buffers
+        timestamps = np.empty(capacity, dtype=np.float64)
+        timestamps[:self._length] = self._timestamps[:self._length]
+        values = np.empty(capacity, dtype=np.float64)
+        values[:self._length] = self._values[:self._length]
+
+        self._timestamps = timestamps
+        self._values = values
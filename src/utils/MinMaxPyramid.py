@@ -0,0 +1,197 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+class MinMaxPyramidLevel:
+    """
+    Growable columnar storage of the buckets of one pyramid level. For every bucket the minimum and maximum sample
+    are kept together with their timestamps, so decimated curves only ever contain real samples.
+    """
+    INITIAL_CAPACITY = 256
+
+    def __init__(self):
+        self.min_times = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self.minimums = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self.max_times = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self.maximums = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self.length = 0
+
+    def extend(self, min_times: np.ndarray, minimums: np.ndarray, max_times: np.ndarray, maximums: np.ndarray):
+        count = len(min_times)
+        if self.length + count > len(self.min_times):
+            capacity = max(len(self.min_times) * 2, self.length + count)
+            for name in ("min_times", "minimums", "max_times", "maximums"):
+                grown = np.empty(capacity, dtype=np.float64)
+                grown[:self.length] = getattr(self, name)[:self.length]
+                setattr(self, name, grown)
+
+        end = self.length + count
+        self.min_times[self.length:end] = min_times
+        self.minimums[self.length:end] = minimums
+        self.max_times[self.length:end] = max_times
+        self.maximums[self.length:end] = maximums
+        self.length = end
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max envelope of a series of samples.
+
+    Level 0 summarizes every FACTOR consecutive samples into one bucket, and every next level summarizes FACTOR
+    buckets of the previous level. Only complete buckets are stored, and the levels are brought up to date
+    incrementally, so the cost of an update is proportional to the number of new samples.
+    """
+    FACTOR = 4
+
+    def __init__(self):
+        self.levels: List[MinMaxPyramidLevel] = []
+        self._samples_processed = 0
+
+    def clear(self):
+        self.levels = []
+        self._samples_processed = 0
+
+    def bucket_size(self, level: int) -> int:
+        """
+        :return: number of raw samples summarized by one bucket of the given level
+        """
+        return self.FACTOR ** (level + 1)
+
+    def update(self, timestamps: np.ndarray, values: np.ndarray):
+        """
+        Summarize samples that were appended since the last update into new buckets
+
+        :param timestamps: timestamps of all samples of the series
+        :param values: values of all samples of the series
+        """
+        complete = (len(values) // self.FACTOR) * self.FACTOR
+        if complete <= self._samples_processed:
+            return
+
+        # Level 0 is built from the raw samples
+        min_times, minimums, max_times, maximums = self._reduce(
+            timestamps[self._samples_processed:complete], values[self._samples_processed:complete],
+            timestamps[self._samples_processed:complete], values[self._samples_processed:complete]
+        )
+        self._samples_processed = complete
+        self._level(0).extend(min_times, minimums, max_times, maximums)
+
+        # Each next level is built from the complete, not yet summarized buckets of the previous one
+        level = 0
+        while self.levels[level].length >= self.FACTOR:
+            source = self.levels[level]
+            target = self._level(level + 1)
+            start = target.length * self.FACTOR
+            end = (source.length // self.FACTOR) * self.FACTOR
+            if end > start:
+                target.extend(*self._reduce(
+                    source.min_times[start:end], source.minimums[start:end],
+                    source.max_times[start:end], source.maximums[start:end]
+                ))
+            level += 1
+
+    def envelope(
+            self,
+            timestamps: np.ndarray,
+            values: np.ndarray,
+            start_index: int,
+            end_index: int,
+            max_points: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the samples in the index range [start_index, end_index), decimated to at most about max_points points.
+        The finest level that fits into max_points is used, and the part of the range not covered by its complete
+        buckets is filled from finer levels. The first and last sample of the range are always included, so decimated
+        curves reach as far as undecimated ones, e.g. up to the samples just outside the visible range.
+
+        :return: (x, y) arrays of the decimated curve. If no decimation is needed, views of the input are returned
+        """
+        self.update(timestamps, values)
+
+        count = end_index - start_index
+        if count <= max_points or not self.levels:
+            return timestamps[start_index:end_index], values[start_index:end_index]
+
+        # Pick the finest level that fits in max_points, each bucket contributes two points, minimum and maximum
+        level = 0
+        while level + 1 < len(self.levels) and count / self.bucket_size(level) * 2 > max_points:
+            level += 1
+
+        x_parts, y_parts = [], []
+        self._collect(level, timestamps, values, start_index, end_index, x_parts, y_parts)
+
+        # The extremes of the edge buckets are rarely the edge samples themselves
+        if x_parts[0][0] > timestamps[start_index]:
+            x_parts.insert(0, timestamps[start_index:start_index + 1])
+            y_parts.insert(0, values[start_index:start_index + 1])
+        if x_parts[-1][-1] < timestamps[end_index - 1]:
+            x_parts.append(timestamps[end_index - 1:end_index])
+            y_parts.append(values[end_index - 1:end_index])
+        return np.concatenate(x_parts), np.concatenate(y_parts)
+
+    def _collect(self, level: int, timestamps: np.ndarray, values: np.ndarray, start_index: int, end_index: int,
+                 x_parts: List[np.ndarray], y_parts: List[np.ndarray]):
+        if level < 0:
+            x_parts.append(timestamps[start_index:end_index])
+            y_parts.append(values[start_index:end_index])
+            return
+
+        size = self.bucket_size(level)
+        pyramid_level = self.levels[level]
+
+        # The bucket holding start_index is included whole, which at most extends the curve slightly to the left
+        first_bucket = start_index // size
+        last_bucket = min(-(-end_index // size), pyramid_level.length)
+
+        if last_bucket <= first_bucket:
+            self._collect(level - 1, timestamps, values, start_index, end_index, x_parts, y_parts)
+            return
+
+        min_times = pyramid_level.min_times[first_bucket:last_bucket]
+        minimums = pyramid_level.minimums[first_bucket:last_bucket]
+        max_times = pyramid_level.max_times[first_bucket:last_bucket]
+        maximums = pyramid_level.maximums[first_bucket:last_bucket]
+
+        # Interleave the minimum and maximum of every bucket in the order in which they occurred
+        min_first = min_times <= max_times
+        x = np.empty(2 * len(min_times), dtype=np.float64)
+        y = np.empty(2 * len(min_times), dtype=np.float64)
+        x[0::2] = np.where(min_first, min_times, max_times)
+        y[0::2] = np.where(min_first, minimums, maximums)
+        x[1::2] = np.where(min_first, max_times, min_times)
+        y[1::2] = np.where(min_first, maximums, minimums)
+        x_parts.append(x)
+        y_parts.append(y)
+
+        # Samples after the last complete bucket are taken from the finer levels
+        if last_bucket * size < end_index:
+            self._collect(level - 1, timestamps, values, last_bucket * size, end_index, x_parts, y_parts)
+
+    def _level(self, level: int) -> MinMaxPyramidLevel:
+        if level == len(self.levels):
+            self.levels.append(MinMaxPyramidLevel())
+        return self.levels[level]
+
+    def _reduce(self, min_times: np.ndarray, minimums: np.ndarray, max_times: np.ndarray, maximums: np.ndarray):
+        # Reshape into rows of FACTOR consecutive entries, and pick the extremes of every row
+        rows = np.arange(len(minimums) // self.FACTOR)
+        argmin = self._argextreme(minimums.reshape(-1, self.FACTOR), np.argmin)
+        argmax = self._argextreme(maximums.reshape(-1, self.FACTOR), np.argmax)
+
+        return (
+            min_times.reshape(-1, self.FACTOR)[rows, argmin],
+            minimums.reshape(-1, self.FACTOR)[rows, argmin],
+            max_times.reshape(-1, self.FACTOR)[rows, argmax],
+            maximums.reshape(-1, self.FACTOR)[rows, argmax]
+        )
+
+    @staticmethod
+    def _argextreme(rows: np.ndarray, function) -> np.ndarray:
+        # NaN samples (e.g. sensor errors) must not hide the real extremes, so they are ignored unless a row is all NaN
+        nan_mask = np.isnan(rows)
+        if not nan_mask.any():
+            return function(rows, axis=1)
+
+        fill = np.inf if function is np.argmin else -np.inf
+        return function(np.where(nan_mask, fill, rows), axis=1)
@@ -0,0 +1,420 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.utils.MeasurementSeries import MeasurementSeries
+from src.utils.SegmentFile import SegmentFile
+
+
+class PersistentMeasurementSeries(MeasurementSeries):
+    """
+    A MeasurementSeries stored in a segment file instead of process memory.
+
+    Samples are appended to the file as they arrive, and read back through a memory map, so the history survives
+    restarts, and only the accessed pages are kept in memory by the OS.
+
+    Old samples can be downsampled with compact: raw samples are replaced with FINE_BUCKET aggregates, and those
+    later with COARSE_BUCKET aggregates. Minimum, mean, maximum and count of every bucket are kept in aggregate
+    segment files next to the raw segment, while the series itself holds the mean of every bucket, at the middle
+    of the bucket, followed by the remaining raw samples. The means are rebuilt from the aggregates whenever raw
+    samples are aggregated, so until then fine means may remain where coarse buckets already exist. Decimated
+    views, e.g. of plots, draw compacted ranges from the minimum and maximum of the buckets instead, and
+    query_extremes offers them to exports.
+
+    Compactions can be prepared in a background thread with prepare_compaction, and swapped in with
+    commit_compaction, while samples keep being appended.
+    """
+    AGGREGATE_DTYPE = np.dtype([
+        ("timestamp", "<f8"),  # start of the bucket
+        ("minimum", "<f8"),
+        ("mean", "<f8"),
+        ("maximum", "<f8"),
+        ("count", "<i8")  # number of samples with a value, NaN samples are not counted
+    ])
+
+    # Lengths of the aggregate buckets in seconds
+    FINE_BUCKET = 10
+    COARSE_BUCKET = 60
+    # Seconds past the retention limit a tier has to lag behind before it is compacted
+    MIN_BACKLOG = 3600
+
+    def __init__(self, segment_path: str, unit: str = ""):
+        super().__init__(initial_capacity=0, unit=unit)
+        # Guards the segments against compactions prepared in another thread, and readers in other threads
+        self._lock = threading.RLock()
+        self.segment = SegmentFile(segment_path)
+        self._records = self.segment.read()
+
+        base_path, _ = os.path.splitext(segment_path)
+        self.fine_segment = SegmentFile(f"{base_path}.10s.agg", self.AGGREGATE_DTYPE)
+        self.coarse_segment = SegmentFile(f"{base_path}.1min.agg", self.AGGREGATE_DTYPE)
+        # Mappings of the aggregate segments, with the (generation, count) of each segment they were mapped at
+        self._aggregates: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._aggregates_key: Optional[Tuple[int, int, int, int]] = None
+
+    def __len__(self):
+        return self.segment.count
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._mapped_records()["timestamp"]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._mapped_records()["value"]
+
+    def append(self, timestamp: float, value: float):
+        with self._lock:
+            self.segment.append(timestamp, value)
+            self._version += 1
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        with self._lock:
+            self.segment.extend(timestamps, values)
+            self._version += len(timestamps)
+
+    def clear(self):
+        """
+        :raises OSError: if the segments cannot be rolled over, the samples left are still readable and appendable
+        """
+        with self._lock:
+            # Drop the own mapping first, so the previous generation of the segment can be removed
+            self._records = None
+            try:
+                self.segment.clear()
+                self.fine_segment.clear()
+                self.coarse_segment.clear()
+            finally:
+                self._pyramid.clear()
+                self._version += 1
+                self._generation += 1
+
+    def close(self):
+        """
+        Close the segment files, no samples can be appended afterwards
+        """
+        with self._lock:
+            self._records = None
+            self._aggregates = None
+            self.segment.close()
+            self.fine_segment.close()
+            self.coarse_segment.close()
+
+    def envelope(self, start: float, end: float, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Like MeasurementSeries.envelope, but compacted ranges are drawn from the aggregate segments, as the minimum
+        and maximum of every bucket at its middle, so peaks are not hidden by the bucket means. Aggregate buckets
+        are merged further if there are too many of them, and the raw samples after them are decimated as usual.
+        """
+        fine, coarse = self._mapped_aggregates()
+        coarse_end, fine_start, fine_end = self._aggregate_coverage(fine, coarse)
+
+        timestamps = self.timestamps
+        raw_start = int(np.searchsorted(timestamps, fine_end, side="left"))
+        start_index = max(int(np.searchsorted(timestamps, start, side="left")) - 1, raw_start)
+        end_index = min(int(np.searchsorted(timestamps, end, side="right")) + 1, len(timestamps))
+        if start_index >= end_index:
+            raw_x, raw_y = np.empty(0), np.empty(0)
+        else:
+            raw_x, raw_y = self._pyramid.envelope(timestamps, self.values, start_index, end_index, max_points)
+            # Pyramid buckets can reach back into the bucket means, which are drawn from the aggregates instead
+            raw_x, raw_y = raw_x[raw_x >= fine_end], raw_y[raw_x >= fine_end]
+
+        if start >= fine_end:
+            return raw_x, raw_y
+
+        # Buckets overlapping the range, and the closest one outside the range on each side
+        buckets = np.concatenate([coarse, fine[fine_start:]])
+        lengths = np.where(np.arange(len(buckets)) < len(coarse), self.COARSE_BUCKET, self.FINE_BUCKET)
+        first = max(int(np.searchsorted(buckets["timestamp"] + lengths, start, side="right")) - 1, 0)
+        last = min(int(np.searchsorted(buckets["timestamp"], end, side="right")) + 1, len(buckets))
+        buckets, lengths = buckets[first:last], lengths[first:last]
+        if len(buckets) == 0:
+            return raw_x, raw_y
+
+        # Every group of buckets contributes two points, its minimum and its maximum
+        group_size = max(-(-2 * len(buckets) // max_points), 1)
+        group_starts = np.arange(0, len(buckets), group_size)
+        group_ends = np.minimum(group_starts + group_size, len(buckets)) - 1
+        middles = (buckets["timestamp"][group_starts] + buckets["timestamp"][group_ends] + lengths[group_ends]) / 2
+
+        x = np.repeat(middles, 2)
+        y = np.empty(len(x))
+        y[0::2] = np.fmin.reduceat(buckets["minimum"], group_starts)
+        y[1::2] = np.fmax.reduceat(buckets["maximum"], group_starts)
+        return np.concatenate([x, raw_x]), np.concatenate([y, raw_y])
+
+    def query(self, start: float, end: float, max_points: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Like MeasurementSeries.query, but decimated results are taken from envelope, so they include the extremes
+        of compacted ranges
+        """
+        if max_points is None:
+            return super().query(start, end)
+
+        x, y = self.envelope(start, end, max_points)
+        in_range = (x >= start) & (x <= end)
+        return x[in_range], y[in_range]
+
+    def query_extremes(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        See MeasurementSeries.query_extremes, bucket means of compacted ranges get the extremes of their bucket
+        """
+        timestamps, values = super().query(start, end)
+        fine, coarse = self._mapped_aggregates()
+        coarse_end, fine_start, fine_end = self._aggregate_coverage(fine, coarse)
+
+        compacted = int(np.searchsorted(timestamps, fine_end, side="left"))
+        if compacted == 0:
+            return values, values
+
+        minimums = np.array(values)
+        maximums = np.array(values)
+        in_coarse = int(np.searchsorted(timestamps, coarse_end, side="left"))
+        for aggregates, part in [(coarse, slice(0, in_coarse)), (fine[fine_start:], slice(in_coarse, compacted))]:
+            if len(aggregates) == 0 or part.stop <= part.start:
+                continue
+            # Every compacted sample lies within the bucket starting at or before it
+            indices = np.maximum(np.searchsorted(aggregates["timestamp"], timestamps[part], side="right") - 1, 0)
+            minimums[part] = aggregates["minimum"][indices]
+            maximums[part] = aggregates["maximum"][indices]
+        return minimums, maximums
+
+    def compact(self, raw_before: float, fine_before: float) -> bool:
+        """
+        Prepare and commit a compaction in the calling thread, see prepare_compaction
+
+        :return: whether any samples were aggregated
+        :raises OSError: if the segments cannot be rewritten
+        """
+        compaction = self.prepare_compaction(raw_before, fine_before)
+        return compaction is not None and self.commit_compaction(compaction)
+
+    def prepare_compaction(self, raw_before: float, fine_before: float) -> Optional["PreparedCompaction"]:
+        """
+        Aggregate raw samples older than raw_before into FINE_BUCKET buckets, and FINE_BUCKET buckets older than
+        fine_before into COARSE_BUCKET buckets. Only complete buckets are aggregated, and only samples not aggregated
+        by previous compactions are processed.
+
+        Each tier is only compacted once its oldest not yet aggregated entry is MIN_BACKLOG seconds past the limit,
+        so the raw segment, which has to be rewritten as a whole, is rewritten at most about once per MIN_BACKLOG.
+        New buckets are appended to the aggregate segments. Fine buckets moved to the coarse tier are left in the
+        fine segment, superseded, until they make up half of it, and only then is the fine segment rewritten.
+
+        The new contents of the segments are prepared without blocking appending, so this is meant to run
+        in a background thread. The series is not changed until the result is passed to commit_compaction,
+        or discarded with discard_compaction.
+
+        :param raw_before: UNIX timestamp, older raw samples are aggregated, -inf to keep all raw samples
+        :param fine_before: UNIX timestamp, older fine aggregates are aggregated further, -inf to keep them
+        :return: the prepared compaction, None if there is not enough to aggregate
+        :raises OSError: if the temporary files cannot be written
+        """
+        # Samples appended later are carried over by commit_compaction
+        with self._lock:
+            generation = self._generation
+            records = self.segment.read()
+            fine = self.fine_segment.read()
+            coarse = self.coarse_segment.read()
+
+        coarse_end, fine_start, fine_end = self._aggregate_coverage(fine, coarse)
+        compaction = PreparedCompaction(
+            generation=generation, raw_count=len(records), fine_count=len(fine), coarse_count=len(coarse)
+        )
+
+        # The raw samples follow the bucket means, which all lie before the end of the last bucket
+        timestamps = records["timestamp"]
+        raw_start = int(np.searchsorted(timestamps, fine_end, side="left"))
+        raw_limit = self._bucket_floor(raw_before, self.FINE_BUCKET)
+        raw_end = max(raw_start, int(np.searchsorted(timestamps, raw_limit, side="left")))
+        if raw_end > raw_start and timestamps[raw_start] <= raw_limit - self.MIN_BACKLOG:
+            compaction.new_fine = self.aggregate_samples(
+                timestamps[raw_start:raw_end], records["value"][raw_start:raw_end], self.FINE_BUCKET
+            )
+        valid_fine = np.concatenate([fine[fine_start:], compaction.new_fine])
+
+        # Fine buckets of complete coarse buckets older than fine_before move to the coarse tier
+        fine_limit = self._bucket_floor(fine_before, self.COARSE_BUCKET)
+        fine_split = int(np.searchsorted(valid_fine["timestamp"], fine_limit, side="left"))
+        if fine_split > 0 and valid_fine["timestamp"][0] <= fine_limit - self.MIN_BACKLOG:
+            compaction.new_coarse = self.merge_aggregates(valid_fine[:fine_split], self.COARSE_BUCKET)
+        else:
+            fine_split = 0
+
+        if len(compaction.new_fine) == 0 and len(compaction.new_coarse) == 0:
+            return None
+
+        try:
+            superseded = fine_start + fine_split
+            if fine_split > 0 and superseded >= len(valid_fine) - fine_split:
+                compaction.fine_path = self.fine_segment.prepare_rewrite(valid_fine[fine_split:])
+
+            # Only aggregating raw samples changes the series, its prefix of bucket means is then rebuilt
+            if len(compaction.new_fine) > 0:
+                prefix = np.concatenate([
+                    self.aggregates_to_records(np.concatenate([coarse, compaction.new_coarse]), self.COARSE_BUCKET),
+                    self.aggregates_to_records(valid_fine[fine_split:], self.FINE_BUCKET)
+                ])
+                compaction.raw_path = self.segment.prepare_rewrite(np.concatenate([prefix, records[raw_end:]]))
+        except OSError:
+            self.discard_compaction(compaction)
+            raise
+        return compaction
+
+    def commit_compaction(self, compaction: "PreparedCompaction") -> bool:
+        """
+        Swap the segments prepared by prepare_compaction in, carrying over the samples appended in the meantime.
+        The aggregate segments are updated first, and the raw segment is then replaced with the one rebuilt
+        from them, so an interrupted compaction is completed by the next one.
+
+        :return: whether the samples of the series changed, False if the compaction was outdated and discarded
+        :raises OSError: if the segments cannot be updated, the remaining temporary files are discarded
+        """
+        with self._lock:
+            if (compaction.generation, compaction.fine_count, compaction.coarse_count) != (
+                    self._generation, self.fine_segment.count, self.coarse_segment.count):
+                # Cleared or compacted in the meantime, the prepared contents are outdated
+                self.discard_compaction(compaction)
+                return False
+
+            try:
+                self.coarse_segment.extend_records(compaction.new_coarse)
+                if compaction.fine_path is not None:
+                    self.fine_segment.commit_rewrite(compaction.fine_path)
+                    compaction.fine_path = None
+                else:
+                    self.fine_segment.extend_records(compaction.new_fine)
+                if compaction.raw_path is None:
+                    return False
+
+                tail = self.segment.read()[compaction.raw_count:]
+                # Drop the own mapping first, so the previous generation of the segment can be removed
+                self._records = None
+                self.segment.commit_rewrite(compaction.raw_path, tail)
+                compaction.raw_path = None
+            except OSError:
+                self.discard_compaction(compaction)
+                raise
+
+            self._pyramid.clear()
+            self._version += 1
+            self._generation += 1
+            return True
+
+    @staticmethod
+    def discard_compaction(compaction: "PreparedCompaction"):
+        """
+        Remove the temporary files of a prepared compaction that will not be committed
+        """
+        for path in [compaction.fine_path, compaction.raw_path]:
+            if path is not None:
+                SegmentFile.discard_rewrite(path)
+        compaction.fine_path = compaction.raw_path = None
+
+    @classmethod
+    def _aggregate_coverage(cls, fine: np.ndarray, coarse: np.ndarray) -> Tuple[float, int, float]:
+        """
+        :return: (end of the coarse buckets, index of the first fine bucket not superseded by them, end of all buckets)
+        """
+        coarse_end = coarse["timestamp"][-1] + cls.COARSE_BUCKET if len(coarse) else float("-inf")
+        fine_start = int(np.searchsorted(fine["timestamp"], coarse_end, side="left"))
+        fine_end = max(coarse_end, fine["timestamp"][-1] + cls.FINE_BUCKET) if len(fine) else coarse_end
+        return coarse_end, fine_start, fine_end
+
+    @classmethod
+    def aggregate_samples(cls, timestamps: np.ndarray, values: np.ndarray, bucket: float) -> np.ndarray:
+        """
+        :return: AGGREGATE_DTYPE records of the buckets of given length containing the samples
+        """
+        starts, first_indices = np.unique(np.floor(timestamps / bucket) * bucket, return_index=True)
+        aggregates = np.empty(len(starts), dtype=cls.AGGREGATE_DTYPE)
+        if len(starts) == 0:
+            return aggregates
+
+        # NaN samples, e.g. sensor errors, are ignored, fmin and fmax only return NaN if all samples are NaN
+        valid = ~np.isnan(values)
+        counts = np.add.reduceat(valid.astype(np.int64), first_indices)
+        sums = np.add.reduceat(np.where(valid, values, 0), first_indices)
+
+        aggregates["timestamp"] = starts
+        aggregates["minimum"] = np.fmin.reduceat(values, first_indices)
+        aggregates["maximum"] = np.fmax.reduceat(values, first_indices)
+        aggregates["count"] = counts
+        with np.errstate(invalid="ignore", divide="ignore"):
+            aggregates["mean"] = np.where(counts > 0, sums / counts, np.nan)
+        return aggregates
+
+    @classmethod
+    def merge_aggregates(cls, aggregates: np.ndarray, bucket: float) -> np.ndarray:
+        """
+        :return: AGGREGATE_DTYPE records of longer buckets, combining the given shorter ones
+        """
+        starts, first_indices = np.unique(np.floor(aggregates["timestamp"] / bucket) * bucket, return_index=True)
+        merged = np.empty(len(starts), dtype=cls.AGGREGATE_DTYPE)
+        if len(starts) == 0:
+            return merged
+
+        counts = np.add.reduceat(aggregates["count"], first_indices)
+        weighted = np.where(aggregates["count"] > 0, aggregates["mean"] * aggregates["count"], 0)
+        sums = np.add.reduceat(weighted, first_indices)
+
+        merged["timestamp"] = starts
+        merged["minimum"] = np.fmin.reduceat(aggregates["minimum"], first_indices)
+        merged["maximum"] = np.fmax.reduceat(aggregates["maximum"], first_indices)
+        merged["count"] = counts
+        with np.errstate(invalid="ignore", divide="ignore"):
+            merged["mean"] = np.where(counts > 0, sums / counts, np.nan)
+        return merged
+
+    @staticmethod
+    def aggregates_to_records(aggregates: np.ndarray, bucket: float) -> np.ndarray:
+        """
+        :return: raw segment records holding the mean of every bucket at the middle of the bucket
+        """
+        records = np.empty(len(aggregates), dtype=SegmentFile.RECORD_DTYPE)
+        records["timestamp"] = aggregates["timestamp"] + bucket / 2
+        records["value"] = aggregates["mean"]
+        return records
+
+    @staticmethod
+    def _bucket_floor(timestamp: float, bucket: float) -> float:
+        # Infinite limits are kept, there is no bucket to align them to
+        return float(np.floor(timestamp / bucket) * bucket) if np.isfinite(timestamp) else timestamp
+
+    def _mapped_aggregates(self) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            # Remap only if buckets were appended, or a segment was rewritten, since the last access
+            key = (
+                self.fine_segment.generation, self.fine_segment.count,
+                self.coarse_segment.generation, self.coarse_segment.count
+            )
+            if self._aggregates is None or key != self._aggregates_key:
+                self._aggregates = (self.fine_segment.read(), self.coarse_segment.read())
+                self._aggregates_key = key
+            return self._aggregates
+
+    def _mapped_records(self) -> np.ndarray:
+        with self._lock:
+            # Remap only if records were appended since the last access
+            if self._records is None or len(self._records) != self.segment.count:
+                self._records = self.segment.read()
+            return self._records
+
+
+@dataclass
+class PreparedCompaction:
+    """
+    Changes of the segments prepared by PersistentMeasurementSeries.prepare_compaction. The temporary files are
+    None once committed or discarded, or if the segment is not rewritten
+    """
+    generation: int  # of the series when the compaction was prepared
+    raw_count: int  # raw records the compaction was prepared from, later ones are carried over
+    fine_count: int  # fine buckets the compaction was prepared from
+    coarse_count: int  # coarse buckets the compaction was prepared from
+    new_fine: np.ndarray = field(default_factory=lambda: np.empty(0, PersistentMeasurementSeries.AGGREGATE_DTYPE))
+    new_coarse: np.ndarray = field(default_factory=lambda: np.empty(0, PersistentMeasurementSeries.AGGREGATE_DTYPE))
+    fine_path: Optional[str] = None  # rewritten fine segment, without the superseded buckets
+    raw_path: Optional[str] = None
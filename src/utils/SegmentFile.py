@@ -0,0 +1,193 @@
+import glob
+import logging
+import os
+import tempfile
+from typing import List
+
+import numpy as np
+
+
+class SegmentFile:
+    """
+    Append-only file of fixed-width records, (timestamp, value) by default, readable through numpy.memmap.
+
+    The file has no header, every record is dtype.itemsize bytes long, so the number of records is determined
+    by the file size alone. A partially written record at the end, e.g. after a crash, is discarded on opening.
+
+    The records are never truncated or overwritten in place, since existing mappings of the file would fault
+    or change under their readers. Clearing and rewriting roll over to a new generation of the file instead,
+    stored next to it as "<path>.<generation>", and the previous generation is removed once it is no longer mapped.
+    The newest generation is opened on startup, and older ones left behind are removed.
+    """
+    RECORD_DTYPE = np.dtype([("timestamp", "<f8"), ("value", "<f8")])
+
+    def __init__(self, path: str, dtype: np.dtype = RECORD_DTYPE):
+        """
+        :param path: path of the first generation of the file, later generations get a numeric suffix
+        :param dtype: dtype of the records
+        """
+        self.path = path
+        self.dtype = dtype
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        generations = self._existing_generations()
+        self.generation = generations[-1] if generations else 0
+        # Older generations left behind by a previous run, removed once no mapping holds them
+        self._stale_paths: List[str] = [self._generation_path(generation) for generation in generations[:-1]]
+        self._remove_stale_paths()
+
+        self.data_path = self._generation_path(self.generation)
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        self.count = size // self.dtype.itemsize
+
+        if size != self.count * self.dtype.itemsize:
+            logging.warning(f"Discarding incomplete record at the end of {self.data_path}")
+            with open(self.data_path, "r+b") as file:
+                file.truncate(self.count * self.dtype.itemsize)
+
+        self._file = open(self.data_path, "ab")
+
+    def append(self, timestamp: float, value: float):
+        self.extend(np.array([timestamp]), np.array([value]))
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        records = np.empty(len(timestamps), dtype=self.dtype)
+        records["timestamp"] = timestamps
+        records["value"] = values
+        self.extend_records(records)
+
+    def extend_records(self, records: np.ndarray):
+        """
+        Append records of the file dtype
+        """
+        self._file.write(np.ascontiguousarray(records, dtype=self.dtype).tobytes())
+        # Flush right away, so the records are visible to readers mapping the file
+        self._file.flush()
+        self.count += len(records)
+
+    def read(self) -> np.ndarray:
+        """
+        Map the records written so far into memory. The pages are loaded by the OS when they are accessed.
+
+        :return: a structured array of the file dtype, e.g. with "timestamp" and "value" fields
+        """
+        # Mappings of previous generations handed out earlier may be gone by now
+        if self._stale_paths:
+            self._remove_stale_paths()
+
+        if self.count == 0:
+            # Empty files cannot be mapped
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.data_path, dtype=self.dtype, mode="r", shape=(self.count,))
+
+    def rewrite(self, records: np.ndarray):
+        """
+        Replace all records by rolling over to a new generation of the file. Existing mappings keep showing
+        the old contents, and a crash leaves either the old or the new generation complete.
+
+        :raises OSError: if the new generation cannot be written, the segment is left unchanged and writable
+        """
+        self.commit_rewrite(self.prepare_rewrite(records))
+
+    def prepare_rewrite(self, records: np.ndarray) -> str:
+        """
+        First step of rewrite, writing the new records to a temporary file. The segment itself is not touched,
+        so the slow part of a rewrite can run in another thread, while records are still appended
+
+        :return: path of the temporary file, to be passed to commit_rewrite or discard_rewrite
+        :raises OSError: if the temporary file cannot be written
+        """
+        directory, name = os.path.split(self.path)
+        descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", prefix=f"{name}.", dir=directory or None)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(np.ascontiguousarray(records, dtype=self.dtype).tobytes())
+        except OSError:
+            self.discard_rewrite(temporary_path)
+            raise
+        return temporary_path
+
+    def commit_rewrite(self, temporary_path: str, tail: np.ndarray = None):
+        """
+        Second step of rewrite, rolling over to the temporary file as the new generation. The new name is
+        not mapped by anyone, so the rename cannot fail the way replacing a mapped file does on Windows
+
+        :param temporary_path: path returned by prepare_rewrite
+        :param tail: records of the file dtype to append to the new generation, e.g. appended since the preparation
+        :raises OSError: if the new generation cannot be written, the segment is left unchanged and writable
+        """
+        generation = self.generation + 1
+        data_path = self._generation_path(generation)
+        try:
+            with open(temporary_path, "ab") as file:
+                if tail is not None:
+                    file.write(np.ascontiguousarray(tail, dtype=self.dtype).tobytes())
+                count = file.tell() // self.dtype.itemsize
+            os.replace(temporary_path, data_path)
+            new_file = open(data_path, "ab")
+        except OSError:
+            # The current generation is still open, so appending keeps working
+            self.discard_rewrite(temporary_path)
+            raise
+
+        self._file.close()
+        self._stale_paths.append(self.data_path)
+
+        self._file = new_file
+        self.generation = generation
+        self.data_path = data_path
+        self.count = count
+
+        self._remove_stale_paths()
+
+    @staticmethod
+    def discard_rewrite(temporary_path: str):
+        """
+        Remove the temporary file of a prepared rewrite that will not be committed
+        """
+        try:
+            os.remove(temporary_path)
+        except OSError as e:
+            logging.error(f"Could not remove temporary segment {temporary_path}: {e}")
+
+    def clear(self):
+        """
+        Remove all records by rolling over to a new, empty generation of the file
+
+        :raises OSError: if the new generation cannot be created, the segment is left unchanged and writable
+        """
+        self.rewrite(np.empty(0, dtype=self.dtype))
+
+    def close(self):
+        self._file.close()
+        self._remove_stale_paths()
+
+    def _remove_stale_paths(self):
+        remaining = []
+        for path in self._stale_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # On Windows a file cannot be removed while it is mapped, retry on the next read
+                logging.debug(f"Could not remove previous segment generation {path} yet: {e}")
+                remaining.append(path)
+        self._stale_paths = remaining
+
+    def _generation_path(self, generation: int) -> str:
+        return self.path if generation == 0 else f"{self.path}.{generation}"
+
+    def _existing_generations(self) -> List[int]:
+        generations = [0] if os.path.exists(self.path) else []
+        for path in glob.glob(glob.escape(self.path) + ".*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                generations.append(int(suffix))
+            elif suffix == "tmp":
+                # An interrupted rewrite, the generation it was replacing is complete
+                os.remove(path)
+        return sorted(generations)
@@ -0,0 +1,25 @@
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from src.utils.PersistentMeasurementSeries import PersistentMeasurementSeries
+
+
+class SeriesCompactor(QObject):
+    """
+    Prepares compactions of persistent measurement series, meant to be moved to a QThread, so aggregating and
+    rewriting the segments does not block the UI thread. The prepared compactions are committed by the receiver
+    of compaction_prepared, in the thread appending the samples.
+    """
+    compaction_prepared = pyqtSignal(object, object)  # series, PreparedCompaction or None if nothing to aggregate
+    compaction_failed = pyqtSignal(object, str)  # series, error message
+
+    @pyqtSlot(object, float, float)
+    def prepare(self, series: PersistentMeasurementSeries, raw_before: float, fine_before: float):
+        """
+        See PersistentMeasurementSeries.prepare_compaction
+        """
+        try:
+            compaction = series.prepare_compaction(raw_before, fine_before)
+        except OSError as e:
+            self.compaction_failed.emit(series, str(e))
+            return
+        self.compaction_prepared.emit(series, compaction)
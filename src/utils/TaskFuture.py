@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, Hashable
+
+
+class TaskFuture(Future):
+    """
+    Handle of a task queued with GenericWorker.add_task, completed by the worker with the result or exception
+    of the task. Tasks replaced by a newer task with the same key are cancelled.
+
+    Completion callbacks added with add_done_callback run in the worker thread, so the UI should react to them
+    through signals. Blocking on result() is meant for threads other than the UI and the worker.
+
+    Enqueue, start and finish times are recorded on the monotonic clock, to measure queueing and execution latency.
+    """
+
+    def __init__(self, task_function: Callable, key: Optional[Hashable] = None, timeout: Optional[float] = None):
+        """
+        :param task_function: callable executed by the worker
+        :param key: key replacing pending tasks with the same key
+        :param timeout: seconds from now the task has to start within, None to wait indefinitely
+        """
+        super().__init__()
+        self.task_function = task_function
+        self.key = key
+
+        self.enqueue_time = time.monotonic()
+        self.deadline = None if timeout is None else self.enqueue_time + timeout
+        self.start_time: Optional[float] = None
+        self.finish_time: Optional[float] = None
+
+    @property
+    def queue_latency(self) -> Optional[float]:
+        """
+        :return: seconds between enqueueing and starting of the task, None if it has not started
+        """
+        return None if self.start_time is None else self.start_time - self.enqueue_time
+
+    @property
+    def run_latency(self) -> Optional[float]:
+        """
+        :return: seconds between starting and finishing of the task, None if it has not finished
+        """
+        if self.start_time is None or self.finish_time is None:
+            return None
+        return self.finish_time - self.start_time
+
+    def is_expired(self, now: float) -> bool:
+        return self.deadline is not None and now > self.deadline
@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Optional
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class TimeCursor(QObject):
+    """
+    Time position shared by all device plots, so hovering over one plot moves the cursor on all of them.
+
+    Positions are reported by the plots on every mouse move, but moved is emitted at most once per display frame,
+    with the latest position, so the cost of updating many plots does not depend on the rate of mouse events.
+    """
+    moved = pyqtSignal(float)
+
+    # About one display frame at 60 Hz
+    UPDATE_INTERVAL_MS = 16
+
+    _instance: Optional["TimeCursor"] = None
+
+    def __init__(self):
+        super().__init__()
+        self.position: Optional[float] = None
+        # Position formatted for display, formatted once per update instead of once per plot
+        self.time_text = ""
+
+        self._pending_position: Optional[float] = None
+
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(self.UPDATE_INTERVAL_MS)
+        self.update_timer.timeout.connect(self._emit_position)
+
+    @classmethod
+    def instance(cls) -> "TimeCursor":
+        """
+        :return: the cursor shared by the whole application
+        """
+        if cls._instance is None:
+            cls._instance = TimeCursor()
+        return cls._instance
+
+    def set_position(self, timestamp: float):
+        """
+        Move the cursor, the move is signalled with the next update
+
+        :param timestamp: UNIX timestamp of the new position
+        """
+        self._pending_position = timestamp
+        # Do not restart an active timer, so continuous movement still produces updates
+        if not self.update_timer.isActive():
+            self.update_timer.start()
+
+    def _emit_position(self):
+        self.position = self._pending_position
+        self.time_text = datetime.fromtimestamp(self.position).strftime("%Y-%m-%d %H:%M:%S")
+        self.moved.emit(self.position)
@@ -1,9 +1,16 @@
-from typing import Type, Tuple, List, Dict
+import os
+import re
+import time
+from typing import Type, Tuple, Dict, Iterable
 
+import numpy as np
 from PyQt5.QtCore import QSettings, QThread, pyqtSignal
 from PyQt5.QtWidgets import QVBoxLayout, QLineEdit, QSpinBox, QFrame, QPushButton
 
 from src.drivers.SerialDeviceBase import SerialDeviceBase
+from src.utils.MeasurementSeries import MeasurementSeries
+from src.utils.PersistentMeasurementSeries import PersistentMeasurementSeries, PreparedCompaction
+from src.utils.SeriesCompactor import SeriesCompactor
 from src.widgets.settings.PlotConfigurationGroupBox import PlotConfigurationGroupBox
 from src.widgets.settings.SerialConfigurationGroupBox import SerialConfigurationGroupBox
 from src.workers.GenericWorker import GenericWorker
@@ -25,6 +32,9 @@ class StatusIndicator(QWidget):
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.toggle_negative_color)
 
+        # Timing of the worker shown in the tooltip, by source
+        self.timing_lines = {}
+
         # Label to display the status circle
         self.status_indicator_label = QLabel(self)
         self.status_indicator_label.setAlignment(Qt.AlignCenter)
@@ -53,6 +63,18 @@ class StatusIndicator(QWidget):
         self.draw_circle()
         self.timer.start(500)
 
+    def on_poll_timing(self, period: float, jitter: float, missed_ticks: int):
+        self.timing_lines["poll"] = (
+            f"Poll period: {period:.3f} s, jitter: {jitter * 1000:.1f} ms, missed ticks: {missed_ticks}"
+        )
+        self.setToolTip("\n".join(self.timing_lines.values()))
+
+    def on_queue_delay(self, lane: str, mean_delay: float, max_delay: float):
+        self.timing_lines[lane] = (
+            f"{lane.capitalize()} task delay: {mean_delay * 1000:.0f} ms, max: {max_delay * 1000:.0f} ms"
+        )
+        self.setToolTip("\n".join(self.timing_lines.values()))
+
     def toggle_negative_color(self):
         # Toggle between the two shades of red to create a flashing effect
         if self.color == self.NEGATIVE_COLOR_LOW:
@@ -75,6 +97,12 @@ class StatusIndicator(QWidget):
 
 class DeviceWidgetBase(QWidget):
     sizeChanged = pyqtSignal()  # Signal to notify that the widget changed size, and any host window should adjust
+    compaction_requested = pyqtSignal(object, float, float)  # series, raw_before, fine_before
+
+    # Directory holding a subdirectory of measurement segments for every device
+    MEASUREMENT_DIRECTORY = "measurements"
+    # Interval of compacting old samples, each time the next series of the widget is compacted
+    COMPACTION_INTERVAL_MS = 60000
 
     def __init__(self, internal_id: str, worker_class: Type[GenericWorker], mock: bool = False):
         super().__init__()
@@ -84,6 +112,33 @@ class DeviceWidgetBase(QWidget):
         # Create the worker for the widget
         self.worker: worker_class = worker_class(internal_id, mock)
 
+        # Sample buffers of all measures of the widget, keyed by the name of the measure
+        self.measurement_series: Dict[str, MeasurementSeries] = {}
+
+        # Retention of old samples, in hours of raw samples and days of 10 s aggregates, 0 meaning forever
+        self.settings.beginGroup(self.worker.device.internal_id)
+        self.settings.beginGroup("retention")
+        self.raw_retention_hours = self.settings.value("raw_hours", 0, type=int)
+        self.aggregate_retention_days = self.settings.value("aggregate_days", 0, type=int)
+        self.settings.endGroup()  # retention
+        self.settings.endGroup()  # internal id
+
+        # Compactions are prepared in a separate thread, and committed here, where the samples are appended
+        self.compactor = SeriesCompactor()
+        self.compaction_thread = QThread()
+        self.compactor.moveToThread(self.compaction_thread)
+        self.compaction_requested.connect(self.compactor.prepare)
+        self.compactor.compaction_prepared.connect(self.on_compaction_prepared)
+        self.compactor.compaction_failed.connect(self.on_compaction_failed)
+        self.compaction_thread.start()
+
+        # Compaction is spread over time, one series at a time
+        self.compaction_index = 0
+        self.compaction_in_progress = False
+        self.compaction_timer = QTimer(self)
+        self.compaction_timer.timeout.connect(self.compact_next_series)
+        self.compaction_timer.start(self.COMPACTION_INTERVAL_MS)
+
         # Setup separate thread for the worker
         self.thread = QThread()
         self.worker.moveToThread(self.thread)
@@ -108,6 +163,8 @@ class DeviceWidgetBase(QWidget):
 
         self.worker.periodic_function_failed.connect(self.status_indicator.on_negative_status)
         self.worker.periodic_function_successful.connect(self.status_indicator.on_positive_status)
+        self.worker.poll_timing_updated.connect(self.status_indicator.on_poll_timing)
+        self.worker.queue_delay_updated.connect(self.status_indicator.on_queue_delay)
 
         self.worker.task_failed.connect(self.status_indicator.on_negative_status)
         self.worker.task_successful.connect(self.status_indicator.on_positive_status)
@@ -125,20 +182,123 @@ class DeviceWidgetBase(QWidget):
 
         self.main_label.setVisible(str(main_label_text).strip() != "")
 
-    def get_measured_values(self) -> Dict[str, List[Tuple[int, float]]]:
+    def add_measurement_series(self, name: str, unit: str = "") -> MeasurementSeries:
+        """
+        Create a sample buffer for a measure, which will be reported by get_measured_values.
+        The samples are stored in a segment file of the device, and samples stored by previous runs are loaded.
+
+        :param name: name of the measure, e.g. "Temperature"
+        :param unit: unit of the measure, e.g. "℃"
+        :return: the created MeasurementSeries
+        """
+        # Replace characters that are not allowed in file names
+        file_name = re.sub(r"[^\w\-. ()]", "_", name)
+        series = PersistentMeasurementSeries(
+            os.path.join(self.MEASUREMENT_DIRECTORY, self.worker.device.internal_id, f"{file_name}.seg"),
+            unit
+        )
+        self.measurement_series[name] = series
+        return series
+
+    def get_measured_values(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
         """
 
-        :return list of a dict of all measurements, where the dict key is the name of the measure, and the value
-         is a list of pairs (x, y), where x is the UNIX timestamp, and y is the measured value
+        :return a dict of all measurements, where the dict key is the name of the measure, and the value
+         is a pair of arrays (x, y), where x are the UNIX timestamps, and y are the measured values.
+         The arrays are views of the sample buffers and must not be modified
         """
-        raise NotImplementedError()
+        return {name: (series.timestamps, series.values) for name, series in self.measurement_series.items()}
+
+    def query(
+            self,
+            channels: Iterable[str] = None,
+            start: float = float("-inf"),
+            end: float = float("inf"),
+            max_points: int = None
+    ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Get the measurements of selected measures within a time range
+
+        :param channels: names of the measures to get, all measures if None
+        :param start: UNIX timestamp of the range start
+        :param end: UNIX timestamp of the range end
+        :param max_points: if given, decimate every measure to about this many points
+        :return: a dict like get_measured_values, limited to the channels and the time range
+        """
+        if channels is None:
+            channels = self.measurement_series.keys()
+
+        return {
+            name: self.measurement_series[name].query(start, end, max_points)
+            for name in channels if name in self.measurement_series
+        }
+
+    def compact_next_series(self):
+        """
+        Start downsampling samples of the next persistent series older than the retention settings allow to keep raw
+        """
+        if self.raw_retention_hours == 0 or self.compaction_in_progress:
+            return
+
+        series = [s for s in self.measurement_series.values() if isinstance(s, PersistentMeasurementSeries)]
+        if not series:
+            return
+
+        compacted_series = series[self.compaction_index % len(series)]
+        self.compaction_index += 1
+
+        now = time.time()
+        raw_before = now - self.raw_retention_hours * 3600
+        fine_before = now - self.aggregate_retention_days * 86400 if self.aggregate_retention_days else float("-inf")
+
+        self.compaction_in_progress = True
+        self.compaction_requested.emit(compacted_series, raw_before, fine_before)
+
+    def on_compaction_prepared(self, series: PersistentMeasurementSeries, compaction: PreparedCompaction):
+        self.compaction_in_progress = False
+        if compaction is None:
+            return
+
+        try:
+            compacted = series.commit_compaction(compaction)
+        except OSError as e:
+            # The series keeps its samples, the next attempt will complete the compaction
+            self.worker.device.logger.error(f"Could not compact measurements: {e}")
+            return
+
+        if compacted and hasattr(self, "plot_widget"):
+            self.plot_widget.redraw()
+
+    def on_compaction_failed(self, series: PersistentMeasurementSeries, reason: str):
+        self.compaction_in_progress = False
+        self.worker.device.logger.error(f"Could not compact measurements: {reason}")
 
     def clear_measured_values(self):
         """
         Erase the contents of the sample buffers
         :return:
         """
-        raise NotImplementedError()
+        for series in self.measurement_series.values():
+            try:
+                series.clear()
+            except OSError as e:
+                self.worker.device.logger.error(f"Could not wipe measurements: {e}")
+
+        if hasattr(self, "plot_widget"):
+            self.plot_widget.redraw()
+
+    def close_measurement_series(self):
+        """
+        Stop compacting and close the segment files of the persistent series, called when the application closes.
+        Temporary files of a compaction prepared but not committed are removed on the next startup
+        """
+        self.compaction_timer.stop()
+        self.compaction_thread.quit()
+        self.compaction_thread.wait()
+
+        for series in self.measurement_series.values():
+            if isinstance(series, PersistentMeasurementSeries):
+                series.close()
 
     def get_settings_widget(self) -> QWidget:
         """
@@ -173,6 +333,31 @@ class DeviceWidgetBase(QWidget):
 
         widget.layout().addLayout(temp_layout)
 
+        # Retention editors, older samples are replaced with 10 s, and then 1 min aggregates
+        temp_layout = QHBoxLayout()
+        temp_layout.addWidget(QLabel("Keep raw samples for"))
+
+        widget.raw_retention_spinbox = QSpinBox()
+        widget.raw_retention_spinbox.setRange(0, 8760)
+        widget.raw_retention_spinbox.setSuffix(" h")
+        widget.raw_retention_spinbox.setSpecialValueText("Forever")
+        widget.raw_retention_spinbox.setValue(self.raw_retention_hours)
+        temp_layout.addWidget(widget.raw_retention_spinbox)
+
+        widget.layout().addLayout(temp_layout)
+
+        temp_layout = QHBoxLayout()
+        temp_layout.addWidget(QLabel("Keep 10 s aggregates for"))
+
+        widget.aggregate_retention_spinbox = QSpinBox()
+        widget.aggregate_retention_spinbox.setRange(0, 3650)
+        widget.aggregate_retention_spinbox.setSuffix(" days")
+        widget.aggregate_retention_spinbox.setSpecialValueText("Forever")
+        widget.aggregate_retention_spinbox.setValue(self.aggregate_retention_days)
+        temp_layout.addWidget(widget.aggregate_retention_spinbox)
+
+        widget.layout().addLayout(temp_layout)
+
         # Add serial settings if the widget device has a "serial" variable defined
         if hasattr(self.worker.device, "serial"):
             widget.serial_configuration_group_box = SerialConfigurationGroupBox(self.worker.device.internal_id)
@@ -226,6 +411,12 @@ class DeviceWidgetBase(QWidget):
         # Update settings with worker interval
         self.settings.setValue("worker/poll_interval_ms", interval_ms)
 
+        # Update settings with retention
+        self.settings.beginGroup("retention")
+        self.settings.setValue("raw_hours", settings_widget.raw_retention_spinbox.value())
+        self.settings.setValue("aggregate_days", settings_widget.aggregate_retention_spinbox.value())
+        self.settings.endGroup()  # retention group
+
         # Update settings with serial parameters
         if isinstance(self.worker.device, SerialDeviceBase) and hasattr(settings_widget,
                                                                         "serial_configuration_group_box"):
@@ -263,6 +454,10 @@ class DeviceWidgetBase(QWidget):
         if self.worker.current_interval != interval_ms:
             self.worker.set_interval(interval_ms)
 
+        # Apply retention, taking effect with the next compaction
+        self.raw_retention_hours = self.settings.value("retention/raw_hours", 0, type=int)
+        self.aggregate_retention_days = self.settings.value("retention/aggregate_days", 0, type=int)
+
         # Apply serial settings
         if hasattr(self.worker.device, "serial"):
             # Close the connection, forcing renewal on next poll
@@ -272,7 +467,8 @@ class DeviceWidgetBase(QWidget):
         if hasattr(self, "plot_widget"):
             self.plot_widget.update_settings()
 
-        # Update the window title with (possibly) new ID
+        # Update the window title and the ID in device logs with (possibly) new ID
+        self.worker.device.logger.refresh_device_id()
         self.setWindowTitle(self.worker.device.device_id())
 
         self.settings.endGroup()  # internal id
@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import QMainWindow, QMdiArea, QAction, QMenu, QMessageBox,
 from src.dialogs.LogViewingDialog import LogViewingDialog
 from src.dialogs.MeasurementViewingDialog import MeasurementDialog
 from src.dialogs.SettingsDialog import SettingsDialog
+from src.widgets.DeviceWidgetBase import DeviceWidgetBase
 from src.widgets.bldc.BLDCWidget import BLDCWidget
 from src.widgets.etc1103.ETC1103Widget import ETC1103Widget
 from src.widgets.eurotherm_32h8i.TemperatureControllerWidget import TemperatureControllerWidget
@@ -120,6 +121,10 @@ class GLADMainWindow(QMainWindow):
                 event.ignore()
                 return
 
+        for subwindow in self.mdi.subWindowList():
+            if isinstance(subwindow.widget(), DeviceWidgetBase):
+                subwindow.widget().close_measurement_series()
+
         event.accept()
 
     def _update_layout_list(self):
@@ -1,21 +1,43 @@
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List
 
 import numpy as np
 import pyqtgraph
-from PyQt5.QtCore import QSettings
+from PyQt5.QtCore import QSettings, QTimer
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QFrame
 from pyqtgraph import PlotWidget, InfiniteLine, DateAxisItem
 
+from src.utils.MeasurementSeries import MeasurementSeries
+from src.utils.TimeCursor import TimeCursor
+from src.widgets.SeriesPlotDataItem import SeriesPlotDataItem
 from src.widgets.settings.PlotConfigurationGroupBox import PlotConfigurationGroupBox
 
 
 class PlotWidgetWithCrosshair(PlotWidget):
-    def __init__(self, internal_id: str, has_profile: bool = False, *args, **kwargs):
+    # Samples arriving within this time are drawn with a single repaint
+    REDRAW_INTERVAL_MS = 50
+
+    def __init__(
+            self,
+            internal_id: str,
+            has_profile: bool = False,
+            measured_series: MeasurementSeries = None,
+            *args,
+            **kwargs
+    ):
         super(PlotWidgetWithCrosshair, self).__init__(axisItems={"bottom": DateAxisItem()}, *args, **kwargs)
         self.internal_id = internal_id
 
+        # Curves bound to series, samples appended to the series are drawn on the next redraw
+        self.measured_series = measured_series if measured_series is not None else MeasurementSeries()
+        self.series_curves: List[SeriesPlotDataItem] = []
+
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(self.REDRAW_INTERVAL_MS)
+        self.redraw_timer.timeout.connect(self.redraw)
+
         # Provide settings as a convenience
         self.settings: QSettings = QSettings("Mirosław Wiącek Code", "GLAD")
 
@@ -45,8 +67,8 @@ class PlotWidgetWithCrosshair(PlotWidget):
 
         self.settings.endGroup()
 
-        self.measured_values_plot = self.plot(
-            [],
+        self.measured_values_plot = self.plot_series(
+            self.measured_series,
             pen=self.measured_plot_pen,
             symbolBrush=self.measured_plot_pen.color(),
             symbolPen=self.measured_plot_pen,
@@ -78,8 +100,50 @@ class PlotWidgetWithCrosshair(PlotWidget):
         self.addItem(self.crosshair_v_line, ignoreBounds=True)
         self.addItem(self.crosshair_h_line, ignoreBounds=True)
 
-        # Connect mouse move event
+        # Connect mouse move event, the vertical line follows the cursor shared by all plots
         self.scene().sigMouseMoved.connect(self.mouse_moved)
+        self.time_cursor = TimeCursor.instance()
+        self.time_cursor.moved.connect(self.time_cursor_moved)
+
+    def plot_series(self, series: MeasurementSeries, **kwargs) -> SeriesPlotDataItem:
+        """
+        Create a curve that displays the samples of a series, and is updated on every redraw
+
+        :param series: series to be displayed
+        :param kwargs: PlotDataItem style arguments, e.g. pen, symbol, name
+        :return: the created curve
+        """
+        curve = SeriesPlotDataItem(series, **kwargs)
+        self.addItem(curve)
+        self.series_curves.append(curve)
+        return curve
+
+    def append_sample(self, timestamp: float, value: float, series: MeasurementSeries = None):
+        """
+        Append a sample to a series displayed by the plot, and schedule a redraw
+
+        :param timestamp: UNIX timestamp of the sample
+        :param value: value of the sample
+        :param series: series to append to, the measured series by default
+        """
+        if series is None:
+            series = self.measured_series
+
+        series.append(timestamp, value)
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        # Do not restart an active timer, so a steady stream of samples cannot postpone the redraw indefinitely
+        if not self.redraw_timer.isActive():
+            self.redraw_timer.start()
+
+    def redraw(self):
+        """
+        Redraw every curve from the current contents of its series, decimated to the visible range
+        """
+        self.redraw_timer.stop()
+        for curve in self.series_curves:
+            curve.refresh()
 
     def mouse_moved(self, evt):
         if not self.sceneBoundingRect().contains(evt):
@@ -92,33 +156,27 @@ class PlotWidgetWithCrosshair(PlotWidget):
         if mousePoint.x() <= 0:
             return
 
-        self.crosshair_v_line.setPos(mousePoint.x())
+        # The horizontal line only makes sense in the plot under the mouse, the rest follows the time cursor
         self.crosshair_h_line.setPos(mousePoint.y())
+        self.time_cursor.set_position(mousePoint.x())
 
-        measured_x_values, measured_y_values = self.measured_values_plot.getData()
-
-        if measured_x_values is None:
-            return
-
-        # Find the index of the nearest x-value
-        idx_measured = np.searchsorted(measured_x_values, mousePoint.x(), side="right")
+    def time_cursor_moved(self, timestamp: float):
+        self.crosshair_v_line.setPos(timestamp)
+        self.crosshair_h_line.setVisible(self.underMouse())
 
         # Create the first part of the label text, since it will always exist
-        label_text = f"Time: {datetime.fromtimestamp(mousePoint.x()).strftime('%Y-%m-%d %H:%M:%S')}"
+        label_text = f"Time: {self.time_cursor.time_text}"
 
-        # Check if index is within bounds and show corresponding y value
-        if 0 <= idx_measured < len(measured_y_values):
-            # Get y values for both plots
-            measured_y = measured_y_values[idx_measured]
-            label_text += f", measured: {measured_y :.2f}"
-        else:
-            label_text += f", measured: none"
+        # Look up the raw samples of every curve, as the curves only hold the decimated ones
+        for curve in self.series_curves:
+            value = curve.series.value_at(timestamp)
+            label_text += f", {curve.name().lower()}: " + (f"{value:.2f}" if value is not None else "none")
 
         if self.has_profile:
             profile_plot_x_data, profile_plot_y_data = self.profile_values_plot.getData()
 
             if profile_plot_x_data is not None:
-                idx_profile = np.searchsorted(profile_plot_x_data, mousePoint.x(), side="right")
+                idx_profile = np.searchsorted(profile_plot_x_data, timestamp, side="right")
 
                 # If the index is not out of the profile X bounds
                 if idx_profile < len(profile_plot_y_data):
@@ -159,15 +217,10 @@ class PlotWidgetWithCrosshair(PlotWidget):
         )
         self.measured_plot_symbol_size = measured_plot_parameters["symbol_size"]
 
-        measured_x_values, measured_y_values = self.measured_values_plot.getData()
-        self.measured_values_plot.setData(
-            x=measured_x_values,
-            y=measured_y_values,
-            pen=self.measured_plot_pen,
-            symbolBrush=self.measured_plot_pen.color(),
-            symbolPen=self.measured_plot_pen,
-            symbolSize=self.measured_plot_symbol_size
-        )
+        self.measured_values_plot.setPen(self.measured_plot_pen)
+        self.measured_values_plot.setSymbolBrush(self.measured_plot_pen.color())
+        self.measured_values_plot.setSymbolPen(self.measured_plot_pen)
+        self.measured_values_plot.setSymbolSize(self.measured_plot_symbol_size)
 
         # Update profile plot parameters
         if self.has_profile:
@@ -0,0 +1,80 @@
+from pyqtgraph import PlotDataItem, ViewBox
+
+from src.utils.MeasurementSeries import MeasurementSeries
+
+
+class SeriesPlotDataItem(PlotDataItem):
+    """
+    A curve that displays a MeasurementSeries through its min/max pyramid. Only about one point per horizontal pixel
+    of the visible range is handed to pyqtgraph, so the render time does not depend on the length of the series.
+    """
+    # Used before the item is placed in a view, or if the view has no size yet
+    DEFAULT_MAX_POINTS = 2000
+
+    def __init__(self, series: MeasurementSeries, *args, max_points: int = None, **kwargs):
+        """
+        :param series: the displayed series
+        :param max_points: fixed number of points to decimate to, by default the width of the view in pixels
+        """
+        super().__init__(*args, **kwargs)
+        self.series = series
+        self.max_points = max_points
+
+        # Whether the displayed data covers the whole series, as opposed to the visible range only
+        self.displays_whole_series = True
+        # Version of the series at the last refresh
+        self.displayed_version = None
+
+    def refresh(self):
+        """
+        Redraw the curve from the current contents of the series
+        """
+        view_box = self.getViewBox()
+        if not isinstance(view_box, ViewBox):
+            view_box = None
+
+        max_points = self.DEFAULT_MAX_POINTS
+        if self.max_points is not None:
+            max_points = self.max_points
+        elif view_box is not None and view_box.width() > 0:
+            max_points = int(view_box.width())
+
+        # With automatic X range the view follows the data bounds, so the whole series has to be displayed
+        if view_box is None or view_box.autoRangeEnabled()[0]:
+            start, end = float("-inf"), float("inf")
+            self.displays_whole_series = True
+        else:
+            start, end = view_box.viewRange()[0]
+            self.displays_whole_series = False
+
+        self.displayed_version = self.series.version
+        x, y = self.series.envelope(start, end, max_points)
+        self.setData(x, y)
+
+    def refresh_if_changed(self):
+        """
+        Redraw the curve only if the series was modified since the last refresh
+        """
+        if self.series.version != self.displayed_version:
+            self.refresh()
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        # Report the X bounds of the whole series rather than of the displayed part, so automatic range
+        # zooms out to the whole series even if only the previously visible range is displayed
+        if ax == 0 and len(self.series) > 0:
+            timestamps = self.series.timestamps
+            return timestamps[0], timestamps[-1]
+        return super().dataBounds(ax, frac, orthoRange)
+
+    def viewRangeChanged(self, *args, **kwargs):
+        super().viewRangeChanged(*args, **kwargs)
+
+        view_box = self.getViewBox()
+        if not isinstance(view_box, ViewBox):
+            return
+
+        # In automatic range mode the whole series is already displayed, unless the mode was just re-enabled
+        if view_box.autoRangeEnabled()[0] and self.displays_whole_series:
+            return
+
+        self.refresh()
@@ -33,4 +33,4 @@ class BLDCWidget(DeviceWidgetBase):
     def on_dac_val_spinbox_editing_finished(self):
         self.worker.add_task(lambda: self.worker.device.set_dac_val(
             self.dac_val_spinbox.value()
-        ))
+        ), key="dac_val")
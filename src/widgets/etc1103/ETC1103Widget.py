@@ -1,9 +1,8 @@
-from typing import Dict, List, Tuple
-
 from PyQt5.QtWidgets import QVBoxLayout, QPushButton, QGroupBox, QLabel, QHBoxLayout
 
 from src.widgets.DeviceWidgetBase import DeviceWidgetBase
 from src.workers.ETC1103Worker import ETC1103Worker
+from src.workers.GenericWorker import TaskPriority
 
 
 class ETC1103Widget(DeviceWidgetBase):
@@ -47,17 +46,11 @@ class ETC1103Widget(DeviceWidgetBase):
         # After all the setup, start the worker thread
         self.thread.start()
 
-    def get_measured_values(self) -> Dict[str, List[Tuple[int, float]]]:
-        return {}
-
-    def clear_measured_values(self):
-        return
-
     def _on_start_button_clicked(self):
         self.worker.add_task(self.worker.device.start_pump)
 
     def _on_stop_button_clicked(self):
-        self.worker.add_task(self.worker.device.stop_pump)
+        self.worker.add_task(self.worker.device.stop_pump, TaskPriority.SAFETY)
 
     def _on_status_ready(self, status: str):
         self.status_label.setText(f"Status: {status}")
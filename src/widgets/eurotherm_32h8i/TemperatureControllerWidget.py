@@ -1,7 +1,7 @@
 import logging
 
 from datetime import datetime, timedelta
-from typing import Iterator, Tuple, List, Dict
+from typing import Iterator
 
 import numpy as np
 from PyQt5.QtCore import QTimer, Qt
@@ -9,6 +9,7 @@ from PyQt5.QtGui import QFont, QColor
 from PyQt5.QtWidgets import QPushButton, QDialog, QHBoxLayout, QVBoxLayout, QLabel, QDoubleSpinBox, QCheckBox, QFrame
 
 from src.dialogs.StartProfileDialog import StartProfileDialog
+from src.utils.MeasurementSeries import MeasurementSeries
 from src.widgets.DeviceWidgetBase import DeviceWidgetBase
 from src.widgets.PlotWidgetWithCrosshair import PlotWidgetWithCrosshair
 from src.widgets.ProfileEditor import ProfileEditor
@@ -37,23 +38,26 @@ class TemperatureControllerWidget(DeviceWidgetBase):
         label_font = QFont()
         label_font.setPointSize(18)
 
-        self.temperature_x_values = []
-        self.temperature_y_values = []
+        self.temperature_series = self.add_measurement_series("Temperature", "℃")
 
-        self.setpoint_x_values = []
-        self.setpoint_y_values = []
+        # Setpoint history is only plotted, not reported as a measurement
+        self.setpoint_series = MeasurementSeries()
 
         self.profile_status_label = QLabel("Profile inactive")
         self.profile_status_timer = QTimer()
         self.profile_status_timer.timeout.connect(self.on_profile_status_timer_timeout)
         self.profile_status_timer.start(15000)
 
-        self.plot_widget = PlotWidgetWithCrosshair(internal_id, has_profile=True)
+        self.plot_widget = PlotWidgetWithCrosshair(
+            internal_id,
+            has_profile=True,
+            measured_series=self.temperature_series
+        )
         self.plot_widget.setMaximumHeight(450)
 
         # Temporary plot for setpoint
-        self.setpoint_plot_data = self.plot_widget.plot(
-            [],
+        self.setpoint_plot_data = self.plot_widget.plot_series(
+            self.setpoint_series,
             pen=QColor("maroon"),
             symbolBrush=QColor("maroon"),
             symbolPen=QColor("maroon"),
@@ -131,19 +135,9 @@ class TemperatureControllerWidget(DeviceWidgetBase):
         # After all the setup, start the worker thread
         self.thread.start()
 
-    def get_measured_values(self) -> Dict[str, List[Tuple[int, float]]]:
-        return {
-            "Temperature": list(zip(self.temperature_x_values, self.temperature_y_values))
-        }
-
     def clear_measured_values(self):
-        self.temperature_x_values = []
-        self.temperature_y_values = []
-        self.plot_widget.measured_values_plot.clear()
-
-        self.setpoint_x_values = []
-        self.setpoint_y_values = []
-        self.setpoint_plot_data.clear()
+        self.setpoint_series.clear()
+        super().clear_measured_values()
 
     def on_profile_status_timer_timeout(self):
         if self.is_profile_executing:
@@ -237,7 +231,7 @@ class TemperatureControllerWidget(DeviceWidgetBase):
         self.setpoint_value_spinbox.setValue(next_y)
         self.setpoint_value_spinbox.blockSignals(False)
 
-        self.worker.add_task(lambda: self.worker.device.set_setpoint_value(next_y))
+        self.worker.add_task(lambda: self.worker.device.set_setpoint_value(next_y), key="setpoint")
 
         logging.info(f"Setting {next_y} deg C, next setpoint in {int(60 * 1000 * next_x)} msec")
 
@@ -274,26 +268,16 @@ class TemperatureControllerWidget(DeviceWidgetBase):
         
     def _on_process_value_ready(self, value: float):
         self.process_value_label.setText(f"PV: {value:.2f} ℃")
-        self.temperature_x_values.append(datetime.now().timestamp())
-        self.temperature_y_values.append(value)
-
-        self.plot_widget.measured_values_plot.setData(
-            self.temperature_x_values,
-            self.temperature_y_values
-        )
+        self.plot_widget.append_sample(datetime.now().timestamp(), value)
 
     def _on_setpoint_value_ready(self, value: float):
-        self.setpoint_x_values.append(datetime.now().timestamp())
-        self.setpoint_y_values.append(value)
+        self.plot_widget.append_sample(datetime.now().timestamp(), value, self.setpoint_series)
         self.setpoint_value_label.setText(f"SP: {value:.2f} ℃")
 
-        self.setpoint_plot_data.setData(
-            self.setpoint_x_values,
-            self.setpoint_y_values
-        )
-
     def _on_setpoint_value_spinbox_editing_finished(self):
-        self.worker.add_task(lambda: self.worker.device.set_setpoint_value(self.setpoint_value_spinbox.value()))
+        self.worker.add_task(
+            lambda: self.worker.device.set_setpoint_value(self.setpoint_value_spinbox.value()), key="setpoint"
+        )
 
     def _on_setpoint_control_changed(self, new_state: Qt.CheckState):
         is_control_enabled = new_state == Qt.Checked
@@ -303,7 +287,7 @@ class TemperatureControllerWidget(DeviceWidgetBase):
 
         if not is_control_enabled:
             self.setpoint_value_spinbox.setValue(20)
-            self.worker.add_task(lambda: self.worker.device.set_setpoint_value(20))
+            self.worker.add_task(lambda: self.worker.device.set_setpoint_value(20), key="setpoint")
 
     def _on_collapse_editor_button_clicked(self):
         if not self.profile_editor.isHidden():
@@ -328,9 +312,8 @@ class TemperatureControllerWidget(DeviceWidgetBase):
 
     def clear_plot_data(self, clear_measured: bool = True, clear_profile: bool = True):
         if clear_measured:
-            self.temperature_x_values = []
-            self.temperature_y_values = []
-            self.plot_widget.measured_values_plot.clear()
+            self.temperature_series.clear()
+            self.plot_widget.redraw()
 
         if clear_profile:
             self.profile_x_data = []
@@ -1,5 +1,4 @@
 from datetime import datetime
-from typing import Tuple, List, Dict
 
 from PyQt5.QtCore import QRegExp
 from PyQt5.QtGui import QRegExpValidator
@@ -20,8 +19,7 @@ class MksEthWidget(DeviceWidgetBase):
         self.worker.flowValueReady.connect(self._on_flow_value_ready)
         self.worker.valveStateReady.connect(self._on_valve_state_ready)
 
-        self.flow_x_values = []
-        self.flow_y_values = []
+        self.flow_series = self.add_measurement_series("Flow")
 
         self.ip_address_label = QLabel(f"IP address: {self.worker.device.modbus_client.host}")
         self.setpoint_spinbox = QDoubleSpinBox()
@@ -29,7 +27,7 @@ class MksEthWidget(DeviceWidgetBase):
         self.setpoint_spinbox.setMaximumWidth(120)
         self.setpoint_spinbox.editingFinished.connect(self._on_setpoint_spinbox_editing_finished)
 
-        self.plot_widget = PlotWidgetWithCrosshair(internal_id, has_profile=False)
+        self.plot_widget = PlotWidgetWithCrosshair(internal_id, has_profile=False, measured_series=self.flow_series)
 
         self.valve_state_group = QGroupBox("Valve mode")
         self.valve_state_group.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
@@ -68,25 +66,8 @@ class MksEthWidget(DeviceWidgetBase):
         # After all the setup, start the worker thread
         self.thread.start()
 
-    def get_measured_values(self) -> Dict[str, List[Tuple[int, float]]]:
-        return {
-            "Flow": list(zip(self.flow_x_values, self.flow_y_values))
-        }
-
-    def clear_measured_values(self):
-        self.flow_x_values = []
-        self.flow_y_values = []
-
-        self.plot_widget.measured_values_plot.setData([], [])
-
     def _on_flow_value_ready(self, new_sample: float):
-        self.flow_x_values.append(datetime.now().timestamp())
-        self.flow_y_values.append(new_sample)
-
-        self.plot_widget.measured_values_plot.setData(
-            self.flow_x_values,
-            self.flow_y_values
-        )
+        self.plot_widget.append_sample(datetime.now().timestamp(), new_sample)
 
     def _on_valve_state_ready(self, new_valve_state: MksEthMfcValveState):
         # Block the signals, as this is information coming from the device, and the change would trigger their change
@@ -106,14 +87,14 @@ class MksEthWidget(DeviceWidgetBase):
             return
 
         if button.text() == "Normal":
-            self.worker.add_task(lambda: self.worker.device.set_valve_state(MksEthMfcValveState.NORMAL))
+            self.worker.add_task(lambda: self.worker.device.set_valve_state(MksEthMfcValveState.NORMAL), key="valve")
         elif button.text() == "Closed":
-            self.worker.add_task(lambda: self.worker.device.set_valve_state(MksEthMfcValveState.CLOSED))
+            self.worker.add_task(lambda: self.worker.device.set_valve_state(MksEthMfcValveState.CLOSED), key="valve")
         elif button.text() == "Open":
-            self.worker.add_task(lambda: self.worker.device.set_valve_state(MksEthMfcValveState.OPEN))
+            self.worker.add_task(lambda: self.worker.device.set_valve_state(MksEthMfcValveState.OPEN), key="valve")
 
     def _on_setpoint_spinbox_editing_finished(self):
-        self.worker.add_task(lambda: self.worker.device.set_setpoint(self.setpoint_spinbox.value()))
+        self.worker.add_task(lambda: self.worker.device.set_setpoint(self.setpoint_spinbox.value()), key="setpoint")
 
     def get_settings_widget(self) -> QWidget:
         widget = super().get_settings_widget()
@@ -158,3 +139,7 @@ class MksEthWidget(DeviceWidgetBase):
 
             # Update the label
             self.ip_address_label.setText(f"IP address: {address}")
+
+            # The device ID contains the host, which the base class applied before it was changed
+            self.worker.device.logger.refresh_device_id()
+            self.setWindowTitle(self.worker.device.device_id())
@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime, timedelta
-from typing import Iterator, Dict, List, Tuple
+from typing import Iterator
 
 import numpy as np
 from PyQt5.QtCore import QTimer
@@ -12,6 +12,7 @@ from src.dialogs.StartProfileDialog import StartProfileDialog
 from src.widgets.DeviceWidgetBase import DeviceWidgetBase
 from src.widgets.PlotWidgetWithCrosshair import PlotWidgetWithCrosshair
 from src.widgets.SlopeProfileEditor import SlopeProfileEditor
+from src.workers.GenericWorker import TaskPriority
 from src.workers.PD500X1Worker import PD500X1Worker
 
 
@@ -25,8 +26,7 @@ class PD500X1Widget(DeviceWidgetBase):
         # Information whether the widget is currently collapsed, used for saving widget geometries
         self.is_collapsed = False
 
-        self.power_x_values = []
-        self.power_y_values = []
+        self.power_series = self.add_measurement_series("Power", "W")
 
         # Profile executor variables
         self.is_profile_executing: bool = False
@@ -80,7 +80,7 @@ class PD500X1Widget(DeviceWidgetBase):
         self.stop_output_button.setFixedHeight(50)
         self.stop_output_button.clicked.connect(self._on_stop_output_button_clicked)
 
-        self.plot_widget = PlotWidgetWithCrosshair(internal_id, has_profile=True)
+        self.plot_widget = PlotWidgetWithCrosshair(internal_id, has_profile=True, measured_series=self.power_series)
         self.plot_widget.setMinimumHeight(200)
         self.plot_widget.setMaximumHeight(400)
 
@@ -131,17 +131,6 @@ class PD500X1Widget(DeviceWidgetBase):
         # After all the setup, start the worker thread
         self.thread.start()
 
-    def get_measured_values(self) -> Dict[str, List[Tuple[int, float]]]:
-        return {
-            "Power": list(zip(self.power_x_values, self.power_y_values))
-        }
-
-    def clear_measured_values(self):
-        self.power_x_values = []
-        self.power_y_values = []
-
-        self.plot_widget.measured_values_plot.setData([], [])
-
     def on_profile_status_timer_timeout(self):
         if self.is_profile_executing:
             self.profile_status_label.setText(f"Next point in {self.profile_editor.profile_plot.float_to_mm_ss(self.profile_timer.remainingTime()/60000)}")
@@ -157,8 +146,11 @@ class PD500X1Widget(DeviceWidgetBase):
             self.dc_output_button.setText("DISABLE DC")
 
     def _on_stop_output_button_clicked(self):
-        self.worker.add_task(self.worker.device.disable_output)
-        self.worker.add_task(lambda: self.worker.device.set_active_target_power_setpoint(0))
+        self.worker.add_task(self.worker.device.disable_output, TaskPriority.SAFETY)
+        # Replaces a pending setpoint write, so it cannot raise the power again after the stop
+        self.worker.add_task(
+            lambda: self.worker.device.set_active_target_power_setpoint(0), TaskPriority.SAFETY, "power_setpoint"
+        )
         self.power_setpoint_spinbox.blockSignals(True)
         self.power_setpoint_spinbox.setValue(0)
         self.power_setpoint_spinbox.blockSignals(False)
@@ -271,11 +263,13 @@ class PD500X1Widget(DeviceWidgetBase):
         self.power_setpoint_spinbox.setValue(int(next_y))
         self.power_setpoint_spinbox.blockSignals(False)
 
-        self.worker.add_task(lambda: self.worker.device.set_active_target_ramp_time(next_x * 60))
+        self.worker.add_task(lambda: self.worker.device.set_active_target_ramp_time(next_x * 60), key="ramp_time")
         logging.info(f"Setting DC output ramp time = {next_x * 60} seconds")
 
         logging.info(f"Setting {next_y} W, next setpoint in {int(next_x * 60 * 1000)} msec")
-        self.worker.add_task(lambda: self.worker.device.set_active_target_power_setpoint(next_y))
+        self.worker.add_task(
+            lambda: self.worker.device.set_active_target_power_setpoint(next_y), key="power_setpoint"
+        )
 
         self.profile_timer.setInterval(int(next_x * 60 * 1000))
 
@@ -299,8 +293,10 @@ class PD500X1Widget(DeviceWidgetBase):
         self.worker.add_task(lambda: self.worker.device.set_active_target_ramp_time(0))
 
         # Disable DC output and set setpoint to 0W
-        self.worker.add_task(self.worker.device.disable_output)
-        self.worker.add_task(lambda: self.worker.device.set_active_target_power_setpoint(0))
+        self.worker.add_task(self.worker.device.disable_output, TaskPriority.SAFETY)
+        self.worker.add_task(
+            lambda: self.worker.device.set_active_target_power_setpoint(0), TaskPriority.SAFETY, "power_setpoint"
+        )
 
         self.profile_editor.setEnabled(True)
         self.profile_action_button.setText("Start profile")
@@ -317,7 +313,8 @@ class PD500X1Widget(DeviceWidgetBase):
 
     def _on_power_setpoint_spinbox_editing_finished(self):
         self.worker.add_task(
-            lambda: self.worker.device.set_active_target_power_setpoint(self.power_setpoint_spinbox.value())
+            lambda: self.worker.device.set_active_target_power_setpoint(self.power_setpoint_spinbox.value()),
+            key="power_setpoint"
         )
 
     def _on_active_target_power_ready(self, active_target_power: float):
@@ -325,19 +322,12 @@ class PD500X1Widget(DeviceWidgetBase):
 
     def _on_actual_power_ready(self, actual_power: float):
         self.actual_power_label.setText(f"{actual_power:.2f} W")
-        self.power_x_values.append(datetime.now().timestamp())
-        self.power_y_values.append(actual_power)
-
-        self.plot_widget.measured_values_plot.setData(
-            self.power_x_values,
-            self.power_y_values
-        )
+        self.plot_widget.append_sample(datetime.now().timestamp(), actual_power)
 
     def clear_plot_data(self, clear_measured: bool = True, clear_profile: bool = True):
         if clear_measured:
-            self.power_x_values = []
-            self.power_y_values = []
-            self.plot_widget.measured_values_plot.clear()
+            self.power_series.clear()
+            self.plot_widget.redraw()
 
         if clear_profile:
             self.profile_x_data = []
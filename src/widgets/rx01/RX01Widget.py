@@ -1,7 +1,7 @@
 import logging
 
 from datetime import datetime, timedelta
-from typing import Iterator, Dict, List, Tuple
+from typing import Iterator
 
 import numpy as np
 from PyQt5.QtCore import QTimer, QThread
@@ -15,6 +15,7 @@ from src.drivers.rx01.RX01 import RX01
 from src.widgets.DeviceWidgetBase import DeviceWidgetBase
 from src.widgets.PlotWidgetWithCrosshair import PlotWidgetWithCrosshair
 from src.widgets.SlopeProfileEditor import SlopeProfileEditor
+from src.workers.GenericWorker import TaskPriority
 from src.workers.MC2Worker import MC2Worker
 from src.workers.RX01Worker import RX01Worker
 
@@ -56,8 +57,7 @@ class RX01Widget(DeviceWidgetBase):
         self.profile_x_data = []
         self.profile_y_data = []
 
-        self.power_x_values = []
-        self.power_y_values = []
+        self.power_series = self.add_measurement_series("Power", "W")
 
         self.profile_status_label = QLabel("Profile inactive")
         self.profile_status_timer = QTimer()
@@ -128,7 +128,7 @@ class RX01Widget(DeviceWidgetBase):
         self.tune_spinbox.setSuffix(" %")
         self.tune_spinbox.editingFinished.connect(self._on_tune_spinbox_editing_finished)
 
-        self.plot_widget = PlotWidgetWithCrosshair(internal_id, has_profile=True)
+        self.plot_widget = PlotWidgetWithCrosshair(internal_id, has_profile=True, measured_series=self.power_series)
         self.plot_widget.setMaximumHeight(450)
 
         self.collapse_editor_button = QPushButton("▼")
@@ -190,17 +190,6 @@ class RX01Widget(DeviceWidgetBase):
         self.thread.start()
         self.mc2_thread.start()
 
-    def get_measured_values(self) -> Dict[str, List[Tuple[int, float]]]:
-        return {
-            "Power": list(zip(self.power_x_values, self.power_y_values))
-        }
-
-    def clear_measured_values(self):
-        self.power_x_values = []
-        self.power_y_values = []
-
-        self.plot_widget.measured_values_plot.setData([], [])
-
     def on_profile_status_timer_timeout(self):
         if self.is_profile_executing:
             self.profile_status_label.setText(f"Next point in {self.profile_editor.profile_plot.float_to_mm_ss(self.profile_timer.remainingTime()/60000)}")
@@ -306,14 +295,18 @@ class RX01Widget(DeviceWidgetBase):
 
         # Depending on the sign of the slope, we have to set different parameters
         if next_y - self.current_setpoint_value > 0:
-            self.worker.add_task(lambda: self.worker.device.set_rf_output_rampup_time_interval(int(next_x * 60)))
+            self.worker.add_task(
+                lambda: self.worker.device.set_rf_output_rampup_time_interval(int(next_x * 60)), key="rampup_time"
+            )
             logging.info(f"Setting RF output ramp up time = {int(next_x * 60)} seconds")
         elif next_y - self.current_setpoint_value < 0:
-            self.worker.add_task(lambda: self.worker.device.set_rf_output_rampdown_time_interval(int(next_x * 60)))
+            self.worker.add_task(
+                lambda: self.worker.device.set_rf_output_rampdown_time_interval(int(next_x * 60)), key="rampdown_time"
+            )
             logging.info(f"Setting RF output ramp down time = {int(next_x * 60)} seconds")
 
         logging.info(f"Setting {next_y} W, next setpoint in {int(next_x * 60 * 1000)} msec")
-        self.worker.add_task(lambda: self.worker.device.set_power_setpoint(next_y))
+        self.worker.add_task(lambda: self.worker.device.set_power_setpoint(next_y), key="power_setpoint")
         self.current_setpoint_value = next_y
 
         self.profile_timer.setInterval(int(next_x * 60 * 1000))
@@ -323,7 +316,7 @@ class RX01Widget(DeviceWidgetBase):
         self.clear_plot_data(clear_measured=False, clear_profile=True)
 
         # Disable RF output
-        self.worker.add_task(self.worker.device.disable_power_and_rf_output)
+        self.worker.add_task(self.worker.device.disable_power_and_rf_output, TaskPriority.SAFETY)
 
         logging.info("Profile stopped")
         self.on_profile_finished()
@@ -341,8 +334,8 @@ class RX01Widget(DeviceWidgetBase):
         self.worker.add_task(self.worker.device.disable_rf_output_ramping)
 
         # Disable RF output and set setpoint to 0W
-        self.worker.add_task(self.worker.device.disable_rf_output)
-        self.worker.add_task(lambda: self.worker.device.set_power_setpoint(0))
+        self.worker.add_task(self.worker.device.disable_rf_output, TaskPriority.SAFETY)
+        self.worker.add_task(lambda: self.worker.device.set_power_setpoint(0), TaskPriority.SAFETY, "power_setpoint")
 
         self.profile_editor.setEnabled(True)
         self.profile_action_button.setText("Start profile")
@@ -360,13 +353,7 @@ class RX01Widget(DeviceWidgetBase):
 
     def _on_forward_power_ready(self, forward_power: float):
         self.forward_power_label.setText(f"{round(forward_power, 2)} W")
-        self.power_x_values.append(datetime.now().timestamp())
-        self.power_y_values.append(forward_power)
-
-        self.plot_widget.measured_values_plot.setData(
-            self.power_x_values,
-            self.power_y_values
-        )
+        self.plot_widget.append_sample(datetime.now().timestamp(), forward_power)
 
     def _on_reflected_power_ready(self, reflected_power: float):
         self.reflected_power_label.setText(f"{reflected_power} W")
@@ -384,7 +371,9 @@ class RX01Widget(DeviceWidgetBase):
         self.rf_output_button.setText("DISABLE RF" if rf_output_enabled else "ENABLE RF")
 
     def _on_power_setpoint_spinbox_editing_finished(self):
-        self.worker.add_task(lambda: self.worker.device.set_power_setpoint(self.power_setpoint_spinbox.value()))
+        self.worker.add_task(
+            lambda: self.worker.device.set_power_setpoint(self.power_setpoint_spinbox.value()), key="power_setpoint"
+        )
 
     def _on_load_spinbox_editing_finished(self):
         self.mc2_worker.add_task(lambda: self.mc2_worker.device.set_mc2_load_cap_preset_position(self.load_spinbox.value()))
@@ -413,8 +402,9 @@ class RX01Widget(DeviceWidgetBase):
             self.auto_manual_button.setText("ENABLE AUTO")
 
     def _on_stop_output_button_clicked(self):
-        self.worker.add_task(self.worker.device.disable_rf_output)
-        self.worker.add_task(lambda: self.worker.device.set_power_setpoint(0))
+        self.worker.add_task(self.worker.device.disable_rf_output, TaskPriority.SAFETY)
+        # Replaces a pending setpoint write, so it cannot raise the power again after the stop
+        self.worker.add_task(lambda: self.worker.device.set_power_setpoint(0), TaskPriority.SAFETY, "power_setpoint")
         self.power_setpoint_spinbox.blockSignals(True)
         self.power_setpoint_spinbox.setValue(0)
         self.power_setpoint_spinbox.blockSignals(False)
@@ -508,6 +498,8 @@ class RX01Widget(DeviceWidgetBase):
 
         # Force disconnect MC2
         self.mc2_worker.device.disconnect()
+        # The MC2 has its own serial port, and its own ID in device logs
+        self.mc2_worker.device.logger.refresh_device_id()
 
         # Update the values in the appropriate group
         self.settings.beginGroup(self.worker.device.internal_id)
@@ -526,9 +518,8 @@ class RX01Widget(DeviceWidgetBase):
 
     def clear_plot_data(self, clear_measured: bool = True, clear_profile: bool = True):
         if clear_measured:
-            self.power_x_values = []
-            self.power_y_values = []
-            self.plot_widget.measured_values_plot.clear()
+            self.power_series.clear()
+            self.plot_widget.redraw()
 
         if clear_profile:
             self.profile_x_data = []
@@ -59,10 +59,10 @@ class SR201Widget(DeviceWidgetBase):
         self.labels[relay_n][1].setText(state.name)
 
     def _on_open_button_clicked(self, idx: int):
-        self.worker.add_task(lambda: self.worker.device.set_relay_state(idx, RelayState.OPEN))
+        self.worker.add_task(lambda: self.worker.device.set_relay_state(idx, RelayState.OPEN), key=f"relay_{idx}")
 
     def _on_close_button_clicked(self, idx: int):
-        self.worker.add_task(lambda: self.worker.device.set_relay_state(idx, RelayState.CLOSED))
+        self.worker.add_task(lambda: self.worker.device.set_relay_state(idx, RelayState.CLOSED), key=f"relay_{idx}")
 
     def get_settings_widget(self) -> QWidget:
         w = super().get_settings_widget()
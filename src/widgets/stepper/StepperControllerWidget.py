@@ -1,5 +1,3 @@
-from typing import Tuple, List, Dict
-
 from PyQt5.QtWidgets import QLabel, QGroupBox, QSpinBox, QFormLayout, QDoubleSpinBox, QPushButton, QWidget
 
 from src.widgets.DeviceWidgetBase import DeviceWidgetBase
@@ -16,8 +14,8 @@ class StepperControllerWidget(DeviceWidgetBase):
         self.worker.device.homeSearchStepReady.connect(self._on_home_search_step_ready)
         self.worker.device.homeSearchStatusReady.connect(self._on_home_search_status_ready)
 
-        self.position_timestamps = []
-        self.position_values = []
+        self.angle_position_series = self.add_measurement_series("Position (deg)", "°")
+        self.step_position_series = self.add_measurement_series("Position (steps)", "steps")
 
         # Widget setup
         # Device values group box
@@ -87,21 +85,6 @@ class StepperControllerWidget(DeviceWidgetBase):
         # After all the setup, start the worker thread
         self.thread.start()
 
-    def get_measured_values(self) -> Dict[str, List[Tuple[int, float]]]:
-        return {
-            f"Position (deg)": list(zip(
-                self.position_timestamps,
-                [self.worker.device.get_angle_from_position(v) for v in self.position_values])),
-            "Position (steps)": list(zip(
-                self.position_timestamps,
-                self.position_values
-            ))
-        }
-
-    def clear_measured_values(self):
-        self.position_timestamps = []
-        self.position_values = []
-
     def get_settings_widget(self) -> QWidget:
         w = super().get_settings_widget()
 
@@ -207,24 +190,28 @@ class StepperControllerWidget(DeviceWidgetBase):
 
     def _on_creep_steps_spinbox_editing_finished(self):
         self.worker.add_task(
-            lambda: self.worker.device.set_creep_steps(self.creep_steps_spinbox.value())
+            lambda: self.worker.device.set_creep_steps(self.creep_steps_spinbox.value()),
+            key="creep_steps"
         )
 
     def _on_creep_speed_spinbox_editing_finished(self):
         self.worker.add_task(
-            lambda: self.worker.device.set_creep_speed(self.creep_speed_spinbox.value())
+            lambda: self.worker.device.set_creep_speed(self.creep_speed_spinbox.value()),
+            key="creep_speed"
         )
 
     def _on_angle_position_spinbox_editing_finished(self):
         self.worker.add_task(
             lambda: self.worker.device.move_absolute(
                 self.worker.device.get_steps_from_angle(self.angle_position_spinbox.value())
-            )
+            ),
+            key="move_absolute"
         )
 
     def _on_velocity_spinbox_editing_finished(self):
         self.worker.add_task(
-            lambda: self.worker.device.set_velocity(self.velocity_spinbox.value())
+            lambda: self.worker.device.set_velocity(self.velocity_spinbox.value()),
+            key="velocity"
         )
 
     def _on_home_search_button_clicked(self):
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Tuple, List, Dict
+from typing import Tuple, List
 
 from PyQt5.QtWidgets import QLabel
 
@@ -12,8 +12,7 @@ class VGC403Widget(DeviceWidgetBase):
     def __init__(self, internal_id: str, mock: bool = False):
         super().__init__(internal_id, VGC403Worker, mock)
 
-        self.measurements_x = [[], [], []]
-        self.measurements_y = [[], [], []]
+        self.sensor_series = [self.add_measurement_series(f"Sensor {i + 1}", "mbar") for i in range(0, 3)]
 
         self.worker.pressureValuesReady.connect(self._on_pressure_values_ready)
 
@@ -29,19 +28,9 @@ class VGC403Widget(DeviceWidgetBase):
         # After all the setup, start the worker thread
         self.thread.start()
 
-    def get_measured_values(self) -> Dict[str, List[Tuple[int, float]]]:
-        return {
-            f"Sensor {i+1}": list(zip(self.measurements_x[i], self.measurements_y[i])) for i in range(0, 3)
-        }
-
-    def clear_measured_values(self):
-        self.measurements_x = [[], [], []]
-        self.measurements_y = [[], [], []]
-
     def _on_pressure_values_ready(self, readouts: List[Tuple[int, VGC403PressureSensorData]]):
         for sensor_n, readout in readouts:
-            self.measurements_x[sensor_n-1].append(datetime.now().timestamp())
-            self.measurements_y[sensor_n-1].append(readout.as_float())
+            self.sensor_series[sensor_n-1].append(datetime.now().timestamp(), readout.as_float())
             if readout.status == 0:
                 self.labels[sensor_n-1].setText(f"Sensor {sensor_n}: {round(readout.value, 2)}e{readout.error} mbar")
             else:
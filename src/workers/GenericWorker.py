@@ -1,18 +1,43 @@
-from typing import Type
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Type, Optional, Callable, Dict, Deque, Hashable, Tuple
 
-from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot, QSettings
-from retry import retry_call
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot, QSettings, Qt
 
 from src.drivers.DeviceBase import DeviceBase
+from src.utils.TaskFuture import TaskFuture
+
+
+class DeviceUnavailableError(ConnectionError):
+    """
+    Raised instead of executing periodic calls and tasks while the device is disconnected and being reconnected
+    """
+
+
+class TaskPriority(IntEnum):
+    """
+    Lanes of the worker task queue. Pending tasks of a lane with a lower value always run first
+    """
+    SAFETY = 0  # e.g. disabling outputs, stopping pumps
+    CONTROL = 1  # e.g. setpoints, mode changes
+    TELEMETRY = 2  # e.g. additional status reads
 
 
 class GenericWorker(QObject):
-    task_received = pyqtSignal(object)
+    task_received = pyqtSignal()
     task_failed = pyqtSignal(str)
     task_successful = pyqtSignal()
 
     periodic_function_failed = pyqtSignal(str)
     periodic_function_successful = pyqtSignal()
+    # Mean period and jitter of the recent periodic calls in seconds, and the number of ticks missed so far
+    poll_timing_updated = pyqtSignal(float, float, int)
+    # Name of the lane, mean and maximum delay between enqueueing and starting of its recent tasks in seconds
+    queue_delay_updated = pyqtSignal(str, float, float)
 
     set_interval_requested = pyqtSignal(int)
     close_connection_requested = pyqtSignal()
@@ -21,12 +46,33 @@ class GenericWorker(QObject):
     DEVICE_CLASS: Type[DeviceBase] = DeviceBase
     MOCK_DEVICE_CLASS: Type[DeviceBase] = DeviceBase
 
+    # Number of recent periodic calls the reported period and jitter are computed from
+    TIMING_WINDOW = 20
+
+    # Delays between reconnection attempts, doubled after every failed attempt up to the maximum
+    RECONNECT_INITIAL_DELAY_MS = 5000
+    RECONNECT_MAX_DELAY_MS = 300000
+
     def __init__(self, internal_id: str, mock: bool, poll_interval: int = 10000):
         """
         Create a generic worker, that based on the implementation values will create a device from the internal ID.
         The worker executes 'function_to_call_periodically' every self.current_interval milliseconds,
         and asynchronously executes tasks passed using add_task.
 
+        Tasks are queued in lanes by TaskPriority, and every time the worker is free to run a task, it takes the
+        oldest task of the highest priority lane, so e.g. a safety stop never waits behind queued setpoint writes.
+        A task added with a key replaces the pending task with the same key, so e.g. only the latest setpoint
+        is written to a slow device. add_task returns a TaskFuture, completed with the result or the exception
+        of the task.
+
+        Periodic calls are scheduled at fixed deadlines on the monotonic clock, so the duration of a call does not
+        delay the following ones. If a call overruns one or more deadlines, the missed ticks are skipped and counted,
+        instead of being caught up with back-to-back calls.
+
+        If the device cannot be connected, it is reconnected from a timer with exponential backoff, so the event loop
+        of the worker keeps running. Until the reconnection succeeds, periodic calls are skipped, and tasks fail
+        immediately with DeviceUnavailableError.
+
         :param internal_id: The ID identifying the unique instance
         :param mock: whether the created device is supposed to be an instance of the real device, or the mock device
         :param poll_interval: initial interval of periodic polling, used only if there is no value defined in settings
@@ -40,7 +86,23 @@ class GenericWorker(QObject):
 
         self.timer = QTimer(self)
         self.timer.setSingleShot(True)
+        # Coarse timers may fire up to 5% of the interval early or late, which would show up as jitter
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.function_to_call_periodically_wrapper)
+
+        self.reconnect_timer = QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self._attempt_reconnect)
+        self.reconnect_delay = self.RECONNECT_INITIAL_DELAY_MS
+
+        # Pending tasks by lane, shared with the threads adding tasks
+        self.task_lanes: Dict[TaskPriority, Deque[TaskFuture]] = {
+            priority: deque() for priority in TaskPriority
+        }
+        self.task_lanes_lock = threading.Lock()
+        self.queue_delays: Dict[TaskPriority, Deque[float]] = {
+            priority: deque(maxlen=self.TIMING_WINDOW) for priority in TaskPriority
+        }
         self.task_received.connect(self.execute_task)
 
         self.set_interval_requested.connect(self._handle_set_interval)
@@ -50,40 +112,85 @@ class GenericWorker(QObject):
 
         settings.beginGroup(self.device.internal_id)
         settings.beginGroup("worker")
-        self.current_interval = settings.value("poll_interval_ms", poll_interval)
+        self.current_interval = settings.value("poll_interval_ms", poll_interval, type=int)
         settings.endGroup()  # worker
         settings.endGroup()  # device ID
 
+        # Monotonic time of the next periodic call, and timing of the recent calls
+        self.next_deadline: Optional[float] = None
+        self.last_tick_time: Optional[float] = None
+        self.tick_periods = deque(maxlen=self.TIMING_WINDOW)
+        self.missed_ticks = 0
+
     def close_connection(self):
         self.close_connection_requested.emit()
 
     @pyqtSlot()
     def _handle_close_connection(self):
         self.device.disconnect()
+        # The settings might have been corrected, so connect on the next call instead of waiting for the backoff
+        self.reconnect_timer.stop()
+
+    def _ensure_connected(self):
+        """
+        Connect the device if it is not connected, with a single attempt. If the attempt fails, reconnection
+        with backoff is started.
+
+        :raises DeviceUnavailableError: if the device is not connected
+        """
+        if self.reconnect_timer.isActive():
+            remaining_s = self.reconnect_timer.remainingTime() / 1000
+            raise DeviceUnavailableError(f"Device disconnected, reconnecting in {remaining_s:.0f} s")
+
+        if self.device.is_connected():
+            return
+
+        try:
+            self.device.connect()
+        except Exception as e:
+            self.reconnect_delay = self.RECONNECT_INITIAL_DELAY_MS
+            self._schedule_reconnect()
+            self.device.logger.error(f"Failed to connect: {e}, reconnecting in {self.reconnect_delay / 1000:.0f} s")
+            raise DeviceUnavailableError(f"Failed to connect: {e}") from e
+
+    def _schedule_reconnect(self):
+        # Jitter spreads the attempts of devices that were disconnected together, e.g. by a USB hub
+        self.reconnect_timer.start(self.reconnect_delay + random.randint(0, self.reconnect_delay // 5))
+
+    @pyqtSlot()
+    def _attempt_reconnect(self):
+        try:
+            self.device.connect()
+        except Exception as e:
+            self.reconnect_delay = min(self.reconnect_delay * 2, self.RECONNECT_MAX_DELAY_MS)
+            self._schedule_reconnect()
+            self.device.logger.warning(
+                f"Reconnection failed: {e}, next attempt in {self.reconnect_delay / 1000:.0f} s"
+            )
+            self.periodic_function_failed.emit(f"Reconnection failed: {e}")
+            return
+
+        self.device.logger.info("Device reconnected")
+        self.reconnect_delay = self.RECONNECT_INITIAL_DELAY_MS
 
     @pyqtSlot()
     def function_to_call_periodically_wrapper(self):
         self.device.logger.debug("Worker starting periodic call")
+        self._record_tick()
         try:
-            if not self.device.is_connected():
-                # Indefinitely try to reconnect
-                retry_call(
-                    f=self.device.connect,
-                    delay=30,
-                    max_delay=300,
-                    jitter=30,
-                    logger=self.device.logger,
-                    on_exception=lambda v: self.periodic_function_failed.emit(str(v))
-                )
+            self._ensure_connected()
             self.device.logger.debug("Device connected for periodic call")
             self.function_to_call_periodically()
             self.device.logger.debug("Periodic call successful")
             self.periodic_function_successful.emit()
+        except DeviceUnavailableError as e:
+            # Skip the call, failed attempts are logged by the reconnection
+            self.periodic_function_failed.emit(str(e))
         except Exception as e:
             self.device.logger.error(f"Error executing periodic function: {e}")
             self.periodic_function_failed.emit(str(e))
         finally:
-            self.timer.start()
+            self._schedule_next_tick()
 
     @pyqtSlot()
     def function_to_call_periodically(self):
@@ -97,36 +204,128 @@ class GenericWorker(QObject):
 
     @pyqtSlot()
     def run(self):
+        self._restart_schedule()
+
+    def _restart_schedule(self):
+        self.next_deadline = time.monotonic() + self.current_interval / 1000
+        self.last_tick_time = None
+        self.tick_periods.clear()
         self.timer.start(self.current_interval)
 
-    @pyqtSlot(object)
-    def execute_task(self, task_function):
-        """Execute a received task."""
+    def _schedule_next_tick(self):
+        interval = self.current_interval / 1000
+        self.next_deadline += interval
+
+        now = time.monotonic()
+        if self.next_deadline < now:
+            # The call overran, skip the missed ticks, so the polls stay aligned to the original schedule
+            missed = int((now - self.next_deadline) // interval) + 1
+            self.next_deadline += missed * interval
+            self.missed_ticks += missed
+            self.device.logger.warning(f"Periodic call overran its interval, skipped {missed} ticks")
+
+        self.timer.start(max(0, round((self.next_deadline - now) * 1000)))
+
+    def _record_tick(self):
+        now = time.monotonic()
+        if self.last_tick_time is not None:
+            self.tick_periods.append(now - self.last_tick_time)
+        self.last_tick_time = now
+
+        if len(self.tick_periods) > 1:
+            self.poll_timing_updated.emit(
+                statistics.fmean(self.tick_periods), statistics.pstdev(self.tick_periods), self.missed_ticks
+            )
+
+    @pyqtSlot()
+    def execute_task(self):
+        """Execute the next task, taken from the highest priority lane with pending tasks."""
+        with self.task_lanes_lock:
+            lane = next((priority for priority in TaskPriority if self.task_lanes[priority]), None)
+            if lane is None:
+                return
+            future = self.task_lanes[lane].popleft()
+
+        # Tasks cancelled while pending are skipped
+        if not future.set_running_or_notify_cancel():
+            return
+
+        future.start_time = time.monotonic()
+        delays = self.queue_delays[lane]
+        delays.append(future.queue_latency)
+        self.queue_delay_updated.emit(lane.name.lower(), statistics.fmean(delays), max(delays))
+
+        if future.is_expired(future.start_time):
+            self.device.logger.error("Task not executed, not started within its deadline")
+            self.task_failed.emit("Task not executed, not started within its deadline")
+            future.finish_time = future.start_time
+            future.set_exception(TimeoutError("Task not started within its deadline"))
+            return
+
         try:
-            if not self.device.is_connected():
-                # Indefinitely try to reconnect
-                retry_call(
-                    f=self.device.connect,
-                    delay=5,
-                    max_delay=10,
-                    jitter=5,
-                    logger=self.device.logger,
-                    on_exception=lambda v: self.task_failed.emit(str(v))
-                )
-
-            task_function()
-            self.task_successful.emit()
+            self._ensure_connected()
+            result = future.task_function()
+        except DeviceUnavailableError as e:
+            # Fail fast, waiting for the device would hold up the tasks queued after this one
+            self.device.logger.error(f"Task not executed: {e}")
+            self.task_failed.emit(f"Task not executed: {e}")
+            future.finish_time = time.monotonic()
+            future.set_exception(e)
         except Exception as e:
             self.device.logger.error(f"Error executing task: {str(e)}")
+            future.finish_time = time.monotonic()
+            future.set_exception(e)
+        else:
+            self.task_successful.emit()
+            future.finish_time = time.monotonic()
+            future.set_result(result)
 
-    def add_task(self, task_function):
+    def add_task(
+            self,
+            task_function: Callable,
+            priority: TaskPriority = TaskPriority.CONTROL,
+            key: Optional[Hashable] = None,
+            timeout: Optional[float] = None
+    ) -> TaskFuture:
         """
         Enqueue a task to be executed by the worker asynchronously
 
         :param task_function: any callable
-        :return: nothing
+        :param priority: lane of the task, tasks of higher priority lanes run before pending lower priority ones
+        :param key: if given, a pending task with the same key is cancelled, e.g. "setpoint", and the new task takes
+         its lane if that has a higher priority. Pending SAFETY tasks are only replaced by SAFETY tasks, a task of
+         a lower priority runs after them instead, e.g. a setpoint change after a stop setting the setpoint to 0
+        :param timeout: seconds the task has to start within, otherwise it fails with TimeoutError without running
+        :return: future of the result of the task
         """
-        self.task_received.emit(task_function)
+        future = TaskFuture(task_function, key, timeout)
+        with self.task_lanes_lock:
+            replaced, replaced_priority = self._remove_pending_task(key, priority) if key is not None else (None, None)
+            if replaced is not None:
+                # The replacement must not run later than the task it replaces
+                priority = min(priority, replaced_priority)
+            self.task_lanes[priority].append(future)
+        # Every signal runs one task in the worker thread, the highest priority one at that time
+        self.task_received.emit()
+
+        # Cancel outside the lock, done callbacks of the replaced task might add tasks
+        if replaced is not None:
+            replaced.cancel()
+        return future
+
+    def _remove_pending_task(self, key: Hashable,
+                             priority: TaskPriority) -> Tuple[Optional[TaskFuture], Optional[TaskPriority]]:
+        # Called with the lock held. Every new task replaces the pending one with its key, except for SAFETY tasks
+        # replaced by a lower priority, so there is at most one pending SAFETY and one other task per key
+        for lane_priority, lane in self.task_lanes.items():
+            if lane_priority == TaskPriority.SAFETY and priority != TaskPriority.SAFETY:
+                continue
+            for future in lane:
+                if future.key == key:
+                    lane.remove(future)
+                    self.device.logger.debug(f"Replaced pending task {key}")
+                    return future, lane_priority
+        return None, None
 
     @pyqtSlot(int)
     def _handle_set_interval(self, interval_ms: int):
@@ -139,7 +338,7 @@ class GenericWorker(QObject):
         if interval_ms != self.current_interval:
             self.current_interval = interval_ms
             self.timer.stop()
-            self.timer.start(self.current_interval)
+            self._restart_schedule()
 
     def set_interval(self, interval_ms: int):
         """
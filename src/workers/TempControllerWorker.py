@@ -15,7 +15,8 @@ class TempControllerWorker(GenericWorker):
     def __init__(self, internal_id: str, mock: bool):
         super().__init__(internal_id, mock)
         self.device.setpointRefreshNeeded.connect(
-            lambda: self.add_task(self.device.set_setpoint_value)
+            # Separate key from setpoint writes, a refresh would drop the new value of a pending write
+            lambda: self.add_task(self.device.set_setpoint_value, key="setpoint_refresh")
         )
 
     @pyqtSlot()